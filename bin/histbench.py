@@ -0,0 +1,466 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# File: Benchmarks of histutil. Each benchmark makes its own synthetic data
+#       (ROOT files, text tables, TMVA-style BDT classes) in a temporary
+#       directory and, where it makes sense, runs over several data sizes.
+#
+#       import   time taken by "import histutil" in a fresh interpreter and
+#                check that it does not load ROOT. The benchmark fails
+#                (exit code 1) if the median time exceeds maxtime seconds.
+#
+#       access   time per access of an ntuple variable through the event
+#                buffer (event.x), for nvars variables read per event, on a
+#                synthetic ntuple. The benchmark fails if the time per
+#                access exceeds maxtime seconds.
+#
+#       ntuple   Ntuple row-by-row iteration and batch reads (arrays)
+#       table    Table loading and row access
+#       bdt      BDT loading and BDT.__call__ throughput
+#       curve    PercentileCurve add and query
+#       roc      mkcdf, mkroc and bootroc. The benchmark fails if bootroc
+#                does not give an area of 0.5 for identical signal and
+#                background scores.
+#       graph    mkgraph and mkhist1 construction and filling
+#
+#       The results are appended to a JSON history file (default
+#       histbench.json) and compared with those of the previous run.
+#
+# Created: 19-Oct-2026
+#-----------------------------------------------------------------------------
+import os, sys
+import json
+import shutil
+import platform
+import subprocess
+import tempfile
+from time import time, strftime
+#-----------------------------------------------------------------------------
+TOPDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_MAXTIME = 0.25 # seconds
+ACCESS_MAXTIME = 1.0e-6 # seconds
+HISTORY = 'histbench.json'
+# a test is flagged if it is slower than in the previous run by this factor
+SLOWER = 1.2
+
+IMPORT_CODE = '''
+import sys, time
+t = time.time()
+import histutil
+t = time.time() - t
+print("%f %d" % (t, 'ROOT' in sys.modules))
+'''
+
+def median(x):
+    x = sorted(x)
+    n = len(x)
+    if n % 2:
+        return x[n//2]
+    return 0.5*(x[n//2-1] + x[n//2])
+
+def importHistutil():
+    # make sure the histutil being benchmarked is the one next to bin/
+    if TOPDIR not in sys.path:
+        sys.path.insert(0, TOPDIR)
+    import histutil
+    return histutil
+
+def timed(function, ntrials=3):
+    # shortest time taken by function() in ntrials trials
+    times = []
+    for trial in range(ntrials):
+        t = time()
+        function()
+        times.append(time() - t)
+    return min(times)
+
+def record(test, size, seconds, units=None):
+    # result of one test; rate is size/seconds in units/s
+    r = {'test': test, 'size': size, 'seconds': seconds}
+    if units != None:
+        r['rate'] = size / max(seconds, 1e-9)
+        r['units'] = units
+    return r
+#-----------------------------------------------------------------------------
+# synthetic data
+#-----------------------------------------------------------------------------
+def makeNtuple(filename, nentries, nvars, treename='Events'):
+    # synthetic ntuple of nvars float and int branches and a std::vector
+    import ROOT
+    df = ROOT.RDataFrame(nentries)
+    for i in range(nvars):
+        if i % 2:
+            df = df.Define('x%d' % i, 'int(rdfentry_ %% %d)' % (i+2))
+        else:
+            df = df.Define('x%d' % i, 'float(rdfentry_) / %d' % (i+1))
+    df = df.Define('v', 'std::vector<float>(rdfentry_ % 4, 1.f)')
+    df.Snapshot(treename, filename)
+
+def makeTable(filename, nrows, nvars, seed=1):
+    # text table: a header of nvars names and nrows rows of numbers
+    from random import Random
+    rng = Random(seed)
+    out = open(filename, 'w')
+    out.write(' '.join(['x%d' % i for i in range(nvars)]) + '\n')
+    for row in range(nrows):
+        out.write(' '.join(['%.6g' % rng.gauss(0, 1)
+                            for i in range(nvars)]) + '\n')
+    out.close()
+
+def makeBDT(filename, ntrees, depth, nvars, seed=1):
+    # TMVA-style BDT class with ntrees trees of the given depth
+    from random import Random
+    rng = Random(seed)
+
+    def node(level):
+        if level == depth:
+            return 'NN(\n0, \n0, \n-1, 0, 1, %d, %.3f,-99) ' % \
+                (rng.choice((-1, 1)), rng.random())
+        left  = node(level+1)
+        right = node(level+1)
+        return 'NN(\n%s, \n%s, \n%d, %.4f, %d, 0, %.3f,-99) ' % \
+            (left, right, rng.randrange(nvars), rng.gauss(0, 1),
+             rng.randint(0, 1), rng.random())
+
+    names = ', '.join(['"x%d"' % i for i in range(nvars)])
+    out = open(filename, 'w')
+    out.write('// Class: ReadBDT\n')
+    out.write('// Automatically generated by histbench.py\n\n')
+    out.write('class ReadBDT : public IClassifierReader {\n\n public:\n\n')
+    out.write('   ReadBDT( std::vector<std::string>& theInputVars )\n')
+    out.write('   {\n      const char* inputVars[] = { %s };\n   }\n' % names)
+    out.write('};\n\n')
+    out.write('void ReadBDT::Initialize()\n{\n')
+    for itree in range(ntrees):
+        out.write('  // itree = %d\n' % itree)
+        out.write('  fBoostWeights.push_back(%.4f);\n' % rng.uniform(0.1, 1))
+        out.write('  fForest.push_back( \n%s   );\n' % node(0))
+    out.write('   return;\n};\n')
+    out.close()
+#-----------------------------------------------------------------------------
+# benchmarks: each returns (ok, list of results)
+#-----------------------------------------------------------------------------
+def benchImport(tmpdir, scale=1, ntrials=5, maxtime=IMPORT_MAXTIME):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([TOPDIR, env.get('PYTHONPATH', '')])
+
+    times = []
+    loaded = False
+    for trial in range(ntrials):
+        out = subprocess.check_output([sys.executable, '-c', IMPORT_CODE],
+                                      env=env)
+        t, root = str.split(out.decode().strip().split('\n')[-1])
+        times.append(float(t))
+        loaded = loaded or int(root)
+
+    t = median(times)
+    print("import histutil: median %8.4f s  min %8.4f s  (%d trials)" % \
+          (t, min(times), ntrials))
+    ok = True
+    if loaded:
+        print("** import histutil loads ROOT")
+        ok = False
+    if t > maxtime:
+        print("** import histutil takes longer than %6.3f s" % maxtime)
+        ok = False
+    return (ok, [record('import', 1, t)])
+
+def benchAccess(tmpdir, scale=1, nentries=20000, nvars=50,
+                maxtime=ACCESS_MAXTIME):
+    histutil = importHistutil()
+    nentries = int(nentries*scale)
+    filename = os.path.join(tmpdir, 'access.root')
+    makeNtuple(filename, nentries, nvars)
+    names = ['x%d' % i for i in range(nvars)]
+    nt = histutil.Ntuple(filename, 'Events')
+
+    # time to read the entries, without accessing the variables
+    def read():
+        for event in nt:
+            pass
+    tread = timed(read, 2)
+
+    # read the entries and get every variable of each
+    code = 'def loop(nt):\n'\
+        '    for event in nt:\n'\
+        '        %s\n' % ' + '.join(['event.%s' % x for x in names])
+    env = {}
+    exec(code, env)
+    tloop = timed(lambda: env['loop'](nt), 2)
+    taccess = max(tloop - tread, 0.0) / (nentries*nvars)
+
+    # repeated access of a single variable of the current entry
+    event = nt.event
+    naccess = 1000000
+    t = time()
+    for i in range(naccess):
+        event.x0
+    tsingle = (time() - t) / naccess
+    os.remove(filename)
+
+    print("event access: %d entries x %d variables" % (nentries, nvars))
+    print("  read entries        %8.3f s" % tread)
+    print("  read and access     %8.3f s" % tloop)
+    print("  per access (loop)   %8.1f ns" % (1e9*taccess))
+    print("  per access (single) %8.1f ns" % (1e9*tsingle))
+    ok = True
+    if tsingle > maxtime:
+        print("** event access takes longer than %8.1f ns" % (1e9*maxtime))
+        ok = False
+    return (ok, [record('loop', nentries*nvars, taccess*nentries*nvars,
+                        'accesses'),
+                 record('single', naccess, tsingle*naccess, 'accesses')])
+
+def benchNtuple(tmpdir, scale=1, sizes=(10000, 100000), nvars=10):
+    histutil = importHistutil()
+    results = []
+    for size in sizes:
+        size = int(size*scale)
+        filename = os.path.join(tmpdir, 'ntuple%d.root' % size)
+        makeNtuple(filename, size, nvars)
+        names = ['x%d' % i for i in range(nvars)]
+        nt = histutil.Ntuple(filename, 'Events')
+
+        def iterate():
+            for event in nt:
+                for name in names:
+                    getattr(event, name)
+        results.append(record('iterate', size, timed(iterate, 1), 'events'))
+        results.append(record('arrays', size, timed(nt.arrays), 'events'))
+        os.remove(filename)
+    return (True, results)
+
+def benchTable(tmpdir, scale=1, sizes=(1000, 10000, 100000), nvars=10):
+    histutil = importHistutil()
+    results = []
+    for size in sizes:
+        size = int(size*scale)
+        filename = os.path.join(tmpdir, 'table%d.txt' % size)
+        makeTable(filename, size, nvars)
+        t = timed(lambda: histutil.Table(filename))
+        results.append(record('load', size, t, 'rows'))
+
+        table = histutil.Table(filename)
+        def rows():
+            for row in table:
+                row('x0')
+        results.append(record('rows', size, timed(rows), 'rows'))
+        os.remove(filename)
+    return (True, results)
+
+def benchBDT(tmpdir, scale=1, forests=((100, 3), (400, 5)), nvars=10,
+             nevents=2000):
+    histutil = importHistutil()
+    from random import Random
+    rng = Random(2)
+    nevents = int(nevents*scale)
+    events = [[rng.gauss(0, 1) for i in range(nvars)]
+              for j in range(nevents)]
+    results = []
+    for ntrees, depth in forests:
+        filename = os.path.join(tmpdir, 'BDT%d_%d.class.C' % (ntrees, depth))
+        makeBDT(filename, ntrees, depth, nvars)
+        t = timed(lambda: histutil.BDT(filename), 1)
+        results.append(record('load%dx%d' % (ntrees, depth), ntrees, t,
+                              'trees'))
+        bdt = histutil.BDT(filename)
+        def evaluate():
+            for event in events:
+                bdt(event)
+        results.append(record('call%dx%d' % (ntrees, depth), nevents,
+                              timed(evaluate, 1), 'events'))
+        # compiled (or loaded from the cache) outside the timing
+        bdt.compile()
+        results.append(record('score%dx%d' % (ntrees, depth), nevents,
+                              timed(lambda: bdt.scores(events)), 'events'))
+        os.remove(filename)
+    return (True, results)
+
+def benchCurve(tmpdir, scale=1, sizes=(100, 1000), npoints=100):
+    histutil = importHistutil()
+    from random import Random
+    rng = Random(3)
+    results = []
+    for size in sizes:
+        size = int(size*scale)
+        curves = [[rng.gauss(i, 1) for i in range(npoints)]
+                  for j in range(size)]
+        def add():
+            c = histutil.PercentileCurve(npoints)
+            for curve in curves:
+                c.add(curve)
+            return c
+        results.append(record('add', size, timed(add), 'curves'))
+        c = add()
+        def query():
+            for p in histutil.PERCENT:
+                c(p)
+        results.append(record('query', size, timed(query)))
+    return (True, results)
+
+def benchROC(tmpdir, scale=1, sizes=(100, 1000, 10000)):
+    histutil = importHistutil()
+    import numpy as np
+    rng = np.random.default_rng(4)
+    sig = rng.normal(1, 1, 100000)
+    bkg = rng.normal(-1, 1, 100000)
+    results = []
+    for nbins in sizes:
+        nbins = int(nbins*scale)
+        hsig = histutil.mkhist1('hsig%d' % nbins, 'x', '', nbins, -5, 5)
+        hbkg = histutil.mkhist1('hbkg%d' % nbins, 'x', '', nbins, -5, 5)
+        hsig.FillN(len(sig), sig, np.ones(len(sig)))
+        hbkg.FillN(len(bkg), bkg, np.ones(len(bkg)))
+        results.append(record('mkcdf', nbins,
+                              timed(lambda: histutil.mkcdf(hsig)), 'bins'))
+        results.append(record('mkroc', nbins,
+                              timed(lambda: histutil.mkroc('roc%d' % nbins,
+                                                           hsig, hbkg)),
+                              'bins'))
+    nreplicas = max(1, int(100*scale))
+    results.append(record('bootroc', nreplicas,
+                          timed(lambda: histutil.bootroc(sig, bkg,
+                                                         nreplicas), 1),
+                          'replicas'))
+    # tied scores must move the curve diagonally
+    ok = True
+    curve, auc = histutil.bootroc(np.zeros(10000), np.zeros(10000), 50)
+    if abs(np.mean(auc) - 0.5) > 1.e-6:
+        print("** bootroc: area %8.4f for identical scores, expected 0.5" % \
+              np.mean(auc))
+        ok = False
+    return (ok, results)
+
+def benchGraph(tmpdir, scale=1, sizes=(10000, 100000, 1000000)):
+    histutil = importHistutil()
+    import numpy as np
+    rng = np.random.default_rng(5)
+    results = []
+    for size in sizes:
+        size = int(size*scale)
+        x = np.sort(rng.uniform(0, 1, size))
+        y = rng.normal(0, 1, size)
+        results.append(record('mkgraph', size,
+                              timed(lambda: histutil.mkgraph(x, y, 'x', 'y',
+                                                             0, 1)),
+                              'points'))
+        results.append(record('decimated', size,
+                              timed(lambda: histutil.mkgraph(x, y, 'x', 'y',
+                                                             0, 1,
+                                                             decimate=True)),
+                              'points'))
+        def hist():
+            h = histutil.mkhist1('h%d' % size, 'x', '', 100, 0, 1)
+            h.FillN(size, x, np.ones(size))
+            return h
+        results.append(record('mkhist1', size, timed(hist), 'points'))
+    return (True, results)
+#-----------------------------------------------------------------------------
+BENCHMARKS = {'import': benchImport,
+              'access': benchAccess,
+              'ntuple': benchNtuple,
+              'table':  benchTable,
+              'bdt':    benchBDT,
+              'curve':  benchCurve,
+              'roc':    benchROC,
+              'graph':  benchGraph}
+
+def environment():
+    # what the results depend on
+    env = {'date': strftime('%Y-%m-%d %H:%M:%S'),
+           'host': platform.node(),
+           'python': platform.python_version()}
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short',
+                                          'HEAD'], cwd=TOPDIR,
+                                         stderr=subprocess.STDOUT)
+        env['commit'] = commit.decode().strip()
+    except:
+        pass
+    if 'ROOT' in sys.modules:
+        env['root'] = sys.modules['ROOT'].gROOT.GetVersion()
+    return env
+
+def printResults(name, results, previous):
+    # print the results of a benchmark and compare them with those of the
+    # previous run, if any
+    old = {}
+    for r in previous.get(name, []):
+        old[(r['test'], r['size'])] = r['seconds']
+    for r in results:
+        rec = "%-8s %-12s %10d %12.6f s" % (name, r['test'], r['size'],
+                                            r['seconds'])
+        if 'rate' in r:
+            rec += " %14.1f %s/s" % (r['rate'], r['units'])
+        key = (r['test'], r['size'])
+        if key in old and old[key] > 0:
+            ratio = r['seconds'] / old[key]
+            rec += "  x%5.2f" % ratio
+            if ratio > SLOWER:
+                rec += " **"
+        print(rec)
+
+def main():
+    argv = sys.argv[1:]
+    if len(argv) > 0 and argv[0] in ('-h', '--help'):
+        sys.exit('''
+    Usage:
+       histbench.py [--history=file] [--scale=factor] [benchmark ...]
+
+    benchmarks: %s (default: all)
+
+    The results are appended to the history file (default %s; "none"
+    for no history) and compared with the previous run. scale multiplies
+    the data sizes.
+        ''' % (', '.join(sorted(BENCHMARKS)), HISTORY))
+
+    history = HISTORY
+    scale = 1.0
+    names = []
+    for arg in argv:
+        if arg[:10] == '--history=':
+            history = arg[10:]
+        elif arg[:8] == '--scale=':
+            scale = float(arg[8:])
+        else:
+            names.append(arg)
+    if len(names) == 0:
+        names = sorted(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            sys.exit("** unknown benchmark %s" % name)
+
+    runs = []
+    if history != 'none' and os.path.exists(history):
+        runs = json.load(open(history))
+    previous = {}
+    if len(runs) > 0:
+        previous = runs[-1]['results']
+
+    ok = True
+    allresults = {}
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for name in names:
+            passed, results = BENCHMARKS[name](tmpdir, scale)
+            ok = passed and ok
+            allresults[name] = results
+            printResults(name, results, previous)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    if history != 'none':
+        run = environment()
+        run['scale'] = scale
+        run['results'] = allresults
+        runs.append(run)
+        out = open(history, 'w')
+        json.dump(runs, out, indent=1)
+        out.close()
+        print("results appended to %s" % history)
+    if not ok:
+        sys.exit(1)
+# -------------------------------------------------------------------------
+try:
+    main()
+except KeyboardInterrupt:
+    print("ciao!")
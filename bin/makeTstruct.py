@@ -14,18 +14,76 @@
 #       Why do this? Because I'm tired of writing the same boilerplate code to
 #       write flat ntuples.
 #
+#       Lines of the form key = value set the options of the writer (which
+#       may also be given on the command line as key=value):
+#
+#          treename    = Events    name of the tree (default Analysis),
+#                                  also given as the second argument
+#          compression = lz4:4     algorithm (zlib, lzma, lz4, zstd) and level
+#          basketsize  = 64000     initial basket size (bytes) of each
+#                                  branch; at the first auto-flush ROOT
+#                                  resizes the baskets (TTree::
+#                                  OptimizeBaskets) to suit the sizes of
+#                                  the branches' entries
+#          splitlevel  = 99        split level of the vector branches
+#          autoflush   = -30000000 flush baskets every n entries (n > 0) or
+#                                  every -n bytes written (n < 0)
+#          autosave    = -300000000 save the tree header likewise
+#          threads     = yes       also make <struct>MT.h, with which
+#                                  several threads can write the n-tuple
+#                                  (their entries are merged every
+#                                  autoflush entries, or 10000 if autoflush
+#                                  is in bytes)
+#
+#       Also made are a reader of the n-tuples, <struct>Reader.h, which reads
+#       only the branches used, through a TTreeCache, and can copy them in
+#       bulk into arrays, and a Python binding, <struct>Reader.py, which
+#       returns the branches as NumPy arrays using the compiled reader.
+#
 # Created: 25-Oct-2015 Harrison B. Prosper
 # Updated: 07-Oct-2016 HBP - slight generalization (allow setting of default
 #                      treename)
+#          19-Oct-2026 make a reader and a Python binding too
+#          19-Oct-2026 add writer options
+#          19-Oct-2026 add multi-threaded writer
 #-----------------------------------------------------------------------------
 import os, sys
-from string import *
 from time import ctime
 #-----------------------------------------------------------------------------
 def nameonly(s):
     import posixpath
     return posixpath.splitext(posixpath.split(s)[1])[0]
 
+# leaf type codes and NumPy types of the scalar types
+TYPES = {'bool':          ('O', 'bool'),
+         'char':          ('B', 'int8'),
+         'unsigned char': ('b', 'uint8'),
+         'short':         ('S', 'int16'),
+         'unsigned short':('s', 'uint16'),
+         'int':           ('I', 'int32'),
+         'unsigned int':  ('i', 'uint32'),
+         'unsigned':      ('i', 'uint32'),
+         'long':          ('L', 'int64'),
+         'unsigned long': ('l', 'uint64'),
+         'long long':     ('L', 'int64'),
+         'Long64_t':      ('L', 'int64'),
+         'ULong64_t':     ('l', 'uint64'),
+         'float':         ('F', 'float32'),
+         'double':        ('D', 'float64')}
+
+# compression algorithms (see ROOT::RCompressionSetting::EAlgorithm)
+ALGORITHMS = {'zlib': 1, 'lzma': 2, 'lz4': 4, 'zstd': 5}
+
+# writer options and their defaults (those of ROOT, except for autoflush,
+# which is that of ROOT expressed as a fixed number of bytes)
+OPTIONS = {'treename':    'Analysis',
+           'compression': 'zlib:1',
+           'basketsize':  '32000',
+           'splitlevel':  '99',
+           'autoflush':   '-30000000',
+           'autosave':    '-300000000',
+           'threads':     'no'}
+
 LTEMPLATE = '''#include <vector>
 #include <string>
 #include <map>
@@ -44,7 +102,7 @@ LTEMPLATE = '''#include <vector>
 HTEMPLATE = '''#ifndef %(structname)s_H
 #define %(structname)s_H
 
-// Created: %(date)s by makeTstruct.py v1.0.1
+// Created: %(date)s by makeTstruct.py v1.1.0
 
 #include <vector>
 #include <string>
@@ -57,14 +115,14 @@ struct %(structname)s
 %(variables)s
   //------------------------------------------------------------------------
   %(structname)s()
-    : file(0), tree(0), clearvalue(0)
+    : file(0), tree(0), clearvalue(0), owner(false)
   {}
 
   %(structname)s(std::string filename,
   %(tab1)sstd::string treename="%(treename)s",
   %(tab1)sstd::string title="%(treename)s",
   %(tab1)sfloat clearvalue_=0)
-    : file(0), tree(0), clearvalue(clearvalue_)
+    : file(0), tree(0), clearvalue(clearvalue_), owner(false)
   {
     Open(filename, treename, title, clearvalue);
   }
@@ -72,47 +130,367 @@ struct %(structname)s
   void Open(std::string filename,
             std::string treename,
             std::string title,
-            float clearvalue_)  
+            float clearvalue_)
   {
-    file = 0;
+    TFile* file_ = new TFile(filename.c_str(), "recreate");
+    assert(file_);
+    assert(file_->IsOpen());
+    file_->SetCompressionSettings(%(compression)d);
+
+    Attach(file_, treename, title, clearvalue_);
+    owner = true;
+  }
+
+  // write the tree to file_, which is not deleted with the struct
+  void Attach(TFile* file_,
+              std::string treename,
+              std::string title,
+              float clearvalue_)
+  {
+    file = file_;
     tree = 0;
     clearvalue = clearvalue_;
-    
-    file = new TFile(filename.c_str(), "recreate");
-    assert(file);
-    assert(file->IsOpen());
-    
+    owner = false;
+
     file->cd();
     tree = new TTree(treename.c_str(), title.c_str());
     assert(tree);
-    
+    tree->SetAutoFlush(%(autoflush)s);
+    tree->SetAutoSave(%(autosave)s);
+
+    // the basket sizes are initial sizes: ROOT resizes the baskets at the
+    // first auto-flush (see TTree::OptimizeBaskets)
 %(branches)s
   }
-  ~%(structname)s() { delete file; }
+  ~%(structname)s() { if ( owner ) delete file; }
 
   void Clear()
   {
 %(clear)s
   }
-  
-  void Fill()
-  {
-    file->cd();
-    tree->Fill();
-  }
-  
+
+  // the tree belongs to the file, so there is no need to make the file
+  // the current directory here
+  void Fill() { tree->Fill(); }
+
   void Close()
   {
     file->cd();
     tree->Write();
   }
-  
+
   TFile* file;
   TTree* tree;
   float clearvalue;
+  bool owner;
 };
 #endif
 '''
+MTEMPLATE = '''#ifndef %(structname)sMT_H
+#define %(structname)sMT_H
+
+// Created: %(date)s by makeTstruct.py v1.1.0
+//
+// Write the n-tuple of %(structname)s.h from several threads at once:
+//
+//   %(structname)sMT output("ntuple.root");
+//
+//   // in each thread
+//   std::unique_ptr<%(structname)sMT::Writer> event = output.MakeWriter();
+//   event->Clear();
+//   event->pt = ...
+//   event->Fill();
+//
+// Each thread fills a tree of its own, in memory, without locking. Every
+// flushentries entries, and when the writer is deleted, a writer sends
+// its entries to a ROOT::TBufferMerger, which appends them to the tree in
+// the output file. The file is closed when output is deleted, which must
+// be after all the writers have been deleted.
+
+#include <memory>
+#include <mutex>
+#include "TROOT.h"
+#include "ROOT/TBufferMerger.hxx"
+#include "%(structname)s.h"
+
+struct %(structname)sMT
+{
+  struct Writer : public %(structname)s
+  {
+    Writer(std::shared_ptr<ROOT::TBufferMergerFile> file_,
+           std::string treename,
+           std::string title,
+           float clearvalue_,
+           Long64_t flushentries_)
+      : %(structname)s(), shared(file_), flushentries(flushentries_), count(0)
+    {
+      shared->SetCompressionSettings(%(compression)d);
+      Attach(shared.get(), treename, title, clearvalue_);
+      // the tree is deleted with the file, not by ROOT
+      tree->ResetBit(kMustCleanup);
+    }
+    ~Writer() { Flush(); }
+
+    void Fill()
+    {
+      tree->Fill();
+      count++;
+      if ( count %% flushentries == 0 ) Flush();
+    }
+
+    // send the entries filled since the last call to the output file
+    void Flush()
+    {
+      if ( tree->GetEntries() > 0 ) shared->Write();
+    }
+
+    std::shared_ptr<ROOT::TBufferMergerFile> shared;
+    Long64_t flushentries;
+    Long64_t count;
+  };
+
+  //------------------------------------------------------------------------
+  %(structname)sMT(std::string filename,
+  %(tab3)sstd::string treename_="%(treename)s",
+  %(tab3)sstd::string title_="%(treename)s",
+  %(tab3)sfloat clearvalue_=0,
+  %(tab3)sLong64_t flushentries_=%(flushentries)s)
+    : merger(filename.c_str(), "recreate", %(compression)d),
+      treename(treename_),
+      title(title_),
+      clearvalue(clearvalue_),
+      flushentries(flushentries_)
+  {
+    ROOT::EnableThreadSafety();
+  }
+
+  // make a writer for the calling thread (may be called from any thread)
+  std::unique_ptr<Writer> MakeWriter()
+  {
+    std::lock_guard<std::mutex> lock(mutex);
+    return std::unique_ptr<Writer>(new Writer(merger.GetFile(),
+                                              treename,
+                                              title,
+                                              clearvalue,
+                                              flushentries));
+  }
+
+  ROOT::TBufferMerger merger;
+  std::string treename;
+  std::string title;
+  float clearvalue;
+  Long64_t flushentries;
+  std::mutex mutex;
+};
+#endif
+'''
+RTEMPLATE = '''#ifndef %(structname)sReader_H
+#define %(structname)sReader_H
+
+// Created: %(date)s by makeTstruct.py v1.1.0
+//
+// Read the n-tuples written with %(structname)s.h:
+//
+//   %(structname)sReader reader("ntuple*.root");
+//   reader.Select({"pt", "jet_pt"});   // read only these branches
+//   for(Long64_t entry=0; entry < reader.GetEntries(); entry++)
+//     {
+//       reader.Read(entry);
+//       ... reader.pt ...
+//     }
+//
+// or reader.Loop(f), which calls f(reader) for each entry, or
+// reader.ReadColumns(first, last, columns), which copies the selected
+// branches of a range of entries into arrays (see %(structname)sReader.py).
+// Branches that are not selected keep the values they last had.
+
+#include <vector>
+#include <string>
+#include <cassert>
+#include <stdexcept>
+#include "TChain.h"
+
+struct %(structname)sReader
+{
+%(variables)s
+  //------------------------------------------------------------------------
+  // filename may contain wildcards. cachesize is the size in bytes of the
+  // TTreeCache (-1: ROOT's default)
+  %(structname)sReader(std::string filename,
+  %(tab2)sstd::string treename="%(treename)s",
+  %(tab2)sLong64_t cachesize=-1)
+    : chain(new TChain(treename.c_str())), entries(0)
+  {
+    chain->Add(filename.c_str());
+    entries = chain->GetEntries();
+    chain->SetCacheSize(cachesize);
+%(addresses)s
+    Select(std::vector<std::string>());
+  }
+  ~%(structname)sReader() { delete chain; }
+
+  // read only the named branches (all if names is empty) and cache them
+  void Select(const std::vector<std::string>& names)
+  {
+    if ( chain->GetCacheSize() > 0 ) chain->DropBranchFromCache("*", true);
+    if ( names.size() == 0 )
+      {
+        chain->SetBranchStatus("*", 1);
+        if ( chain->GetCacheSize() > 0 ) chain->AddBranchToCache("*", true);
+      }
+    else
+      {
+        chain->SetBranchStatus("*", 0);
+        for(size_t i=0; i < names.size(); i++)
+          {
+            chain->SetBranchStatus(names[i].c_str(), 1);
+            if ( chain->GetCacheSize() > 0 )
+              chain->AddBranchToCache(names[i].c_str(), true);
+          }
+      }
+    if ( chain->GetCacheSize() > 0 ) chain->StopCacheLearningPhase();
+  }
+
+  Long64_t GetEntries() const { return entries; }
+
+  int Read(Long64_t entry) { return chain->GetEntry(entry); }
+
+  // call f(*this) for entries first...last-1 (last < 0: to the end)
+  template <typename F>
+  Long64_t Loop(F f, Long64_t first=0, Long64_t last=-1)
+  {
+    if ( last < 0 || last > entries ) last = entries;
+    for(Long64_t entry=first; entry < last; entry++)
+      {
+        chain->GetEntry(entry);
+        f(*this);
+      }
+    return last > first ? last - first : 0;
+  }
+
+  // copy the branches of entries first...last-1 (last < 0: to the end)
+  // into columns, which holds, for each variable in order, the address
+  // of an array with an element per entry (scalars) or the addresses of
+  // a std::vector<Long64_t> of offsets and a std::vector of values to
+  // which the entries are appended (vectors); 0 skips a variable.
+  // Vectors of vectors and scalars of other types have no columns.
+  // Returns the number of entries read.
+  Long64_t ReadColumns(Long64_t first, Long64_t last,
+                       const std::vector<Long64_t>& columns)
+  {
+    if ( columns.size() != %(ncolumns)d )
+      throw std::invalid_argument("%(structname)sReader::ReadColumns: "
+                                  "%(ncolumns)d columns expected");
+    if ( last < 0 || last > entries ) last = entries;
+    Long64_t k = 0;
+    for(Long64_t entry=first; entry < last; entry++, k++)
+      {
+        chain->GetEntry(entry);
+%(copy)s
+      }
+    return k;
+  }
+
+  TChain*  chain;
+  Long64_t entries;
+%(pointers)s};
+#endif
+'''
+PTEMPLATE = '''#-----------------------------------------------------------------------------
+# File: %(structname)sReader.py
+#       Read the n-tuples written with %(structname)s.h into NumPy arrays,
+#       in bulk, using the compiled reader %(structname)sReader.h:
+#
+#         from %(structname)sReader import %(structname)sReader
+#         reader = %(structname)sReader("ntuple*.root")
+#         data = reader.arrays(["pt", "jet_pt"])
+#
+#       Scalars give 1-D arrays, vectors histutil.Jagged arrays (or pairs
+#       of offsets and values, if histutil is not available).
+#
+# Created: %(date)s by makeTstruct.py v1.1.0
+#-----------------------------------------------------------------------------
+import os, sys
+import numpy as np
+import ROOT
+#-----------------------------------------------------------------------------
+HEADER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      '%(structname)sReader.h')
+
+# (name, NumPy type, C++ type of the values) of each variable; the C++
+# type is None for scalars. Vectors of vectors, and scalars of types
+# without a NumPy type, are omitted.
+VARIABLES = [
+%(fields)s]
+
+def _load():
+    # compile the reader (optimized, with ACLiC) once, or failing that
+    # give it to the interpreter
+    if not hasattr(ROOT, '%(structname)sReader'):
+        if not ROOT.gSystem.CompileMacro(HEADER, 'kO'):
+            ROOT.gInterpreter.Declare('#include "%%s"' %% HEADER)
+
+class %(structname)sReader:
+    \'\'\'
+    reader = %(structname)sReader(filename, treename="%(treename)s",
+    %(tab2)s cachesize=-1)
+    data = reader.arrays(variables=None, first=0, nrows=None)
+    \'\'\'
+    def __init__(self, filename, treename="%(treename)s", cachesize=-1):
+        _load()
+        self.reader = ROOT.%(structname)sReader(filename, treename, cachesize)
+
+    def __len__(self):
+        return int(self.reader.GetEntries())
+
+    def variables(self):
+        return [name for name, dtype, ctype in VARIABLES]
+
+    def arrays(self, variables=None, first=0, nrows=None):
+        if variables == None:
+            variables = self.variables()
+        last = len(self)
+        if nrows != None:
+            last = min(first + nrows, last)
+        nrows = max(last - first, 0)
+
+        selected = ROOT.std.vector('std::string')()
+        for name in variables:
+            selected.push_back(name)
+        self.reader.Select(selected)
+
+        columns = ROOT.std.vector('Long64_t')()
+        data = {}
+        for name, dtype, ctype in VARIABLES:
+            if name not in variables:
+                columns.push_back(0)
+                if ctype != None: columns.push_back(0)
+            elif ctype == None:
+                data[name] = np.zeros(nrows, dtype=dtype)
+                columns.push_back(data[name].ctypes.data)
+            else:
+                offsets = ROOT.std.vector('Long64_t')(1, 0)
+                values  = ROOT.std.vector(ctype)()
+                data[name] = (offsets, values)
+                columns.push_back(ROOT.addressof(offsets))
+                columns.push_back(ROOT.addressof(values))
+        for name in variables:
+            if name not in data:
+                sys.exit("** %(structname)sReader ** can't read %%s" %% name)
+
+        self.reader.ReadColumns(first, last, columns)
+
+        try:
+            from histutil import Jagged
+        except ImportError:
+            Jagged = lambda offsets, values: (offsets, values)
+        for name, dtype, ctype in VARIABLES:
+            if name in data and ctype != None:
+                offsets, values = data[name]
+                data[name] = Jagged(np.array(offsets, dtype=np.int64),
+                                    np.array(values).astype(dtype))
+        return data
+'''
 #-----------------------------------------------------------------------------
 def main():
     argv = sys.argv[1:]
@@ -120,77 +498,181 @@ def main():
     if argc < 1:
         sys.exit('''
     Usage:
-       makeTstruct.py variables-file [tree-name=Analysis]
-        ''')
+       makeTstruct.py variables-file [treename=Analysis] [key=value ...]
+
+    keys: %s
+        ''' % ', '.join(sorted(OPTIONS)))
 
     # get name of file containing variables
     varfile = argv[0]
     if not os.path.exists(varfile):
         sys.exit("** can't open file %s" % varfile)
 
-    treename = "Analysis"
-    if len(argv) > 1:
-        treename = argv[1]
-        
+    settings = [x for x in argv[1:] if x.find('=') > -1]
+    argv = [x for x in argv[1:] if x.find('=') < 0]
+
     name = nameonly(varfile)
-    structname = capitalize(name)
+    structname = str.capitalize(name)
     names = {'structname': structname,
              'date': ctime(),
              'tab1': ' '*len(structname)+' ',
-             'treename': treename
+             'tab2': ' '*len(structname)+'       ',
+             'tab3': ' '*len(structname)+'   '
              }
-        
+
     # read file containing  variables
-    records = filter(lambda x: (x[0] != '#') or (x[0] != "/"),
-                     filter(lambda x: x != '',
-                     map(strip, open(varfile).readlines())))    
+    records = [str.strip(x) for x in open(varfile).readlines()]
+    records = [x for x in records
+               if (x != '') and (x[0] != '#') and (x[0] != "/")]
+
+    # get options: those on the command line override those in the file
+    options = OPTIONS.copy()
+    settings = [x for x in records if x.find('=') > -1] + settings
+    records  = [x for x in records if x.find('=') < 0]
+    for record in settings:
+        key, value = [str.strip(x) for x in str.split(record, '=', 1)]
+        if key not in options:
+            sys.exit("** unknown option %s\n\tchoose from: %s" % \
+                     (key, ', '.join(sorted(OPTIONS))))
+        options[key] = value
+    # the tree name may also be given without the key
+    if len(argv) > 0:
+        options['treename'] = argv[0]
+    if options['treename'] == '':
+        sys.exit("** the tree name must not be empty")
+    names['treename'] = options['treename']
+    algorithm, level = (str.split(options['compression'], ':') + ['1'])[:2]
+    if algorithm not in ALGORITHMS:
+        sys.exit("** unknown compression algorithm %s\n\tchoose from: %s" % \
+                 (algorithm, ', '.join(sorted(ALGORITHMS))))
+    try:
+        level = int(level)
+        for key in ['basketsize', 'splitlevel', 'autoflush', 'autosave']:
+            options[key] = str(int(options[key]))
+    except ValueError:
+        sys.exit("** options must be integers, except treename, "\
+                 "compression and threads")
+    names['compression'] = 100*ALGORITHMS[algorithm] + level
+    names['autoflush']   = options['autoflush']
+    names['autosave']    = options['autosave']
+    if options['threads'] not in ['yes', 'no']:
+        sys.exit("** threads must be yes or no")
+    names['flushentries'] = options['autoflush']
+    if int(options['autoflush']) <= 0:
+        names['flushentries'] = '10000'
+    for key in sorted(options):
+        print("\t%-12s= %s" % (key, options[key]))
+    print('')
     variables = ''
     branches  = ''
     clear     = ''
+    addresses = ''
+    pointers  = ''
+    copy      = ''
+    fields    = ''
+    ncolumns  = 0
     for record in records:
         if record[-1] == ';': record = record[:-1]
-        record = replace(record, '> >', '@')
-        t  = split(record)
-        ftype = replace(t[0], '@', '> >')
-        
+        record = str.replace(record, '> >', '@')
+        t  = str.split(record)
+        ftype = str.replace(t[0], '@', '> >')
+        # allow for multi-word types, e.g., unsigned int
+        while len(t) > 2 and ' '.join([ftype, t[1]]) in TYPES:
+            ftype = ' '.join([ftype, t[1]])
+            t = t[1:]
+
         vectorType = ftype[0] == 'v'
         if vectorType:
-            ftype = replace(ftype, 'vector', 'std::vector')
-            
-        ft = upper(ftype[0])
-        
+            ftype = str.replace(ftype, 'vector', 'std::vector')
+            etype = str.strip(ftype[ftype.find('<')+1:ftype.rfind('>')])
+            nested = etype.find('vector') > -1
+        elif ftype in TYPES:
+            ft, dtype = TYPES[ftype]
+        else:
+            ft, dtype = str.upper(ftype[0]), None
+
         # get fields
-        t  = joinfields(t[1:], '')
-        t  = split(t, ",")
+        t  = ''.join(t[1:])
+        t  = str.split(t, ",")
         for field in t:
             variables += '  %s\t%s;\n' % (ftype, field)
             if vectorType:
-                branches  += '    tree->Branch("%s", "%s", \t&%s);\n' % \
-                (field, ftype, field)
-                clear     += '    %s.clear();\n' % field               
+                branches  += '    tree->Branch("%s", "%s", \t&%s, %s, %s);\n' % \
+                (field, ftype, field, options['basketsize'],
+                 options['splitlevel'])
+                clear     += '    %s.clear();\n' % field
+                pointers  += '  %s*\tp_%s;\n' % (ftype, field)
+                addresses += '    p_%s = &%s;\n' % (field, field)
+                addresses += '    chain->SetBranchAddress("%s", &p_%s);\n' % \
+                (field, field)
+                if not nested:
+                    # values of vector<bool> are stored as unsigned char
+                    vtype = etype
+                    if vtype == 'bool': vtype = 'unsigned char'
+                    copy += '''        if ( columns[%(i)d] )
+          {
+            std::vector<%(vtype)s>& v =
+              *reinterpret_cast<std::vector<%(vtype)s>*>(columns[%(j)d]);
+            v.insert(v.end(), %(field)s.begin(), %(field)s.end());
+            reinterpret_cast<std::vector<Long64_t>*>(columns[%(i)d])
+              ->push_back(v.size());
+          }
+''' % {'i': ncolumns, 'j': ncolumns+1, 'vtype': vtype, 'field': field}
+                    fields += "    ('%s', '%s', '%s'),\n" % \
+                        (field, TYPES.get(etype, ('', 'float64'))[1], vtype)
+                    ncolumns += 2
             else:
-                branches  += '    tree->Branch("%s", &%s, \t"%s/%s");\n' % \
-                (field, field, field, ft)
-                clear     += '    %s\t= clearvalue;\n' % field               
-            print "\t%s\t%s" % (ftype, field)
-            
+                branches  += '    tree->Branch("%s", &%s, \t"%s/%s", %s);\n' % \
+                (field, field, field, ft, options['basketsize'])
+                clear     += '    %s\t= clearvalue;\n' % field
+                addresses += '    chain->SetBranchAddress("%s", &%s);\n' % \
+                (field, field)
+                if dtype != None:
+                    copy += '        if ( columns[%d] ) '\
+                        'reinterpret_cast<%s*>(columns[%d])[k] = %s;\n' % \
+                        (ncolumns, ftype, ncolumns, field)
+                    fields += "    ('%s', '%s', None),\n" % (field, dtype)
+                    ncolumns += 1
+            print("\t%s\t%s" % (ftype, field))
+
     # write out header
     names['variables'] = variables
-    names['branches']  = rstrip(branches)
-    names['clear']     = rstrip(clear)
-    
+    names['branches']  = str.rstrip(branches)
+    names['clear']     = str.rstrip(clear)
+    names['addresses'] = str.rstrip(addresses)
+    names['pointers']  = pointers
+    names['copy']      = str.rstrip(copy)
+    names['fields']    = fields
+    names['ncolumns']  = ncolumns
+
     header = "%(structname)s.h" % names
-    print "\nwriting %s" % header
+    print("\nwriting %s" % header)
     record = HTEMPLATE % names
     open(header, "w").write(record)
 
     linkdef= "%(structname)s_linkdef.h" % names
-    print "\nwriting %s" % linkdef
+    print("\nwriting %s" % linkdef)
     record = LTEMPLATE % names
-    open(linkdef, "w").write(record)    
+    open(linkdef, "w").write(record)
+
+    if options['threads'] == 'yes':
+        threaded = "%(structname)sMT.h" % names
+        print("\nwriting %s" % threaded)
+        record = MTEMPLATE % names
+        open(threaded, "w").write(record)
+
+    reader = "%(structname)sReader.h" % names
+    print("\nwriting %s" % reader)
+    record = RTEMPLATE % names
+    open(reader, "w").write(record)
+
+    binding = "%(structname)sReader.py" % names
+    print("\nwriting %s" % binding)
+    record = PTEMPLATE % names
+    open(binding, "w").write(record)
 # -------------------------------------------------------------------------
 try:
     main()
 except KeyboardInterrupt:
-    print "ciao!"
-    
+    print("ciao!")
+
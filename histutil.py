@@ -7,8 +7,8 @@
 #          20-Oct-2017 HBP - add option to choose branches in Ntuple
 #-----------------------------------------------------------------------------
 import os, sys, re
-import ROOT
 import math
+import time
 from glob import glob
 from array import array
 from ctypes import c_int
@@ -22,6 +22,30 @@ warnings.filterwarnings( action='ignore', category=RuntimeWarning,
                          message='Error in <TClass::BuildRealData>: '\
                              'Cannot find any ShowMembers function for G__CINT_IOFLAGS!')
 #---------------------------------------------------------------------------
+# ROOT takes seconds to load, so it is imported only when first used, that
+# is, when a ROOT-backed object is first created. Until then, ROOT is a
+# stand-in that imports the module and replaces itself with it. Copies of
+# the stand-in (e.g., made by "from histutil import *") can't be replaced,
+# so they pass on every use, including assignments, to the module.
+class _LazyROOT(object):
+    def __load(self):
+        import ROOT as root
+        globals()['ROOT'] = root
+        return root
+
+    def __getattr__(self, name):
+        return getattr(self.__load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.__load(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self.__load(), name)
+
+    def __dir__(self):
+        return dir(self.__load())
+ROOT = _LazyROOT()
+#---------------------------------------------------------------------------
 def nameonly(s):
     import posixpath
     return posixpath.splitext(posixpath.split(s)[1])[0]
@@ -72,15 +96,145 @@ TITLE_FONTSIZE    = 0.04
 #   1=bottom adjusted, 2=centered, 3=top adjusted
 ALIGN_LEFT_BOTTOM = 11
 #------------------------------------------------------------------------------
+# Kinematics. The arguments may be numbers, NumPy arrays (e.g., columns
+# from Ntuple.arrays) or Jagged arrays of objects per event, in which case
+# arrays with a value per event are broadcast to each object of the event.
+def _apply(function, *args):
+    jagged = [x for x in args if isinstance(x, Jagged)]
+    if len(jagged) == 0:
+        args = [x if not isinstance(x, (list, tuple)) else
+                __import__('numpy').asarray(x) for x in args]
+        return function(*args)
+    import numpy as np
+    offsets = jagged[0].offsets
+    counts  = None
+    values  = []
+    for x in args:
+        if isinstance(x, Jagged):
+            if x.offsets is not offsets and \
+                    not np.array_equal(x.offsets, offsets):
+                raise ValueError("Jagged arrays with different counts")
+            values.append(x.content)
+        elif np.ndim(x) > 0:
+            if counts is None: counts = np.diff(offsets)
+            values.append(np.repeat(np.asarray(x), counts))
+        else:
+            values.append(x)
+    result = function(*values)
+    if isinstance(result, tuple):
+        return tuple([Jagged(offsets, r) for r in result])
+    return Jagged(offsets, result)
+
+def _deltaPhi(phi1, phi2):
+    return (phi2 - phi1 + math.pi) % (2*math.pi) - math.pi
+
 def deltaPhi(phi1, phi2):
-    deltaphi = phi2 - phi1;
-    if fabs(deltaphi) > pi:
-        return 2 * pi - fabs(deltaphi)
-    else:
-        return deltaphi
+    # phi2 - phi1 in [-pi, pi)
+    return _apply(_deltaPhi, phi1, phi2)
+
+def _deltaR(eta1, phi1, eta2, phi2):
+    import numpy as np
+    return np.hypot(eta2 - eta1, _deltaPhi(phi1, phi2))
+
+def deltaR(eta1, phi1, eta2, phi2):
+    return _apply(_deltaR, eta1, phi1, eta2, phi2)
+
+def _pxpypz(pt, eta, phi):
+    import numpy as np
+    return (pt*np.cos(phi), pt*np.sin(phi), pt*np.sinh(eta))
+
+def pxpypz(pt, eta, phi):
+    return _apply(_pxpypz, pt, eta, phi)
+
+def _ptetaphi(px, py, pz):
+    import numpy as np
+    pt = np.hypot(px, py)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        eta = np.arcsinh(pz / pt)
+    return (pt, eta, np.arctan2(py, px))
+
+def ptetaphi(px, py, pz):
+    # eta is +/-inf for momenta along the beam
+    return _apply(_ptetaphi, px, py, pz)
+
+def _invariantMass(pt1, eta1, phi1, m1, pt2, eta2, phi2, m2):
+    import numpy as np
+    px1, py1, pz1 = _pxpypz(pt1, eta1, phi1)
+    px2, py2, pz2 = _pxpypz(pt2, eta2, phi2)
+    e1 = np.sqrt(px1**2 + py1**2 + pz1**2 + m1**2)
+    e2 = np.sqrt(px2**2 + py2**2 + pz2**2 + m2**2)
+    m2 = (e1 + e2)**2 - (px1 + px2)**2 - (py1 + py2)**2 - (pz1 + pz2)**2
+    return np.sqrt(np.maximum(m2, 0))
+
+def invariantMass(pt1, eta1, phi1, m1, pt2, eta2, phi2, m2):
+    return _apply(_invariantMass, pt1, eta1, phi1, m1, pt2, eta2, phi2, m2)
+
+def pairs(a):
+    '''
+    first, second = pairs(a)
+
+    The two members of each pair of objects i < j of each event of the
+    Jagged array a, as Jagged arrays with the same counts, ordered by j
+    then i; e.g., the dimuon masses are
 
-def setStyle():
-    style = ROOT.TStyle("histutil", "histutil")
+        pt1, pt2 = pairs(mu_pt)
+        ...
+        m = invariantMass(pt1, eta1, phi1, 0.106, pt2, eta2, phi2, 0.106)
+    '''
+    import numpy as np
+    counts  = a.counts()
+    npairs  = counts*(counts-1)//2
+    offsets = np.zeros(len(counts)+1, dtype=np.int64)
+    np.cumsum(npairs, out=offsets[1:])
+    # pairs (i, j) ordered by j then i: the pairs of n objects are the
+    # first n(n-1)/2 of those of any larger number of objects
+    nmax = int(counts.max()) if len(counts) > 0 else 0
+    j, i = np.tril_indices(max(nmax, 1), -1)
+    event = np.repeat(np.arange(len(counts)), npairs)
+    k = np.arange(offsets[-1]) - offsets[:-1][event]
+    start = a.offsets[:-1][event]
+    return (Jagged(offsets, a.content[start + i[k]]),
+            Jagged(offsets, a.content[start + j[k]]))
+
+#------------------------------------------------------------------------------
+# Styles are configured once and cached as a master copy; subsequent calls
+# to setStyle copy the master into the current style, which undoes any
+# changes made to gStyle since. Named variants are registered with addStyle
+# and are applied on top of the histutil style.
+_styles = {}
+_styleVariants = {}
+
+def addStyle(name, configure):
+    '''
+    addStyle(name, configure)
+
+    Register a named style variant. configure(style) is called once, on the
+    first setStyle(name), with a TStyle already set up as the histutil style.
+    '''
+    _styleVariants[name] = configure
+    if name in _styles:
+        del _styles[name]
+
+def setStyle(name="histutil"):
+    if name not in _styles:
+        if name != "histutil" and name not in _styleVariants:
+            sys.exit("** setStyle ** unknown style %s" % name)
+
+        master = ROOT.TStyle("%s_master" % name, name)
+        _configureStyle(master)
+        if name in _styleVariants:
+            _styleVariants[name](master)
+        # the master is not a style that can be made current by name
+        ROOT.gROOT.GetListOfStyles().Remove(master)
+        _styles[name] = (master, ROOT.TStyle(name, name))
+
+    master, style = _styles[name]
+    master.Copy(style)
+    style.SetName(name)
+    style.cd()
+    return style
+
+def _configureStyle(style):
     style.SetPalette(1)
     
     # For the canvases
@@ -187,7 +341,6 @@ def setStyle():
 
     # Postscript options:
     style.SetPaperSize(20.,20.)
-    style.cd()
 #------------------------------------------------------------------------------
 def expo(x, fmt="%4.2f", code="#"):
     s = "%10.3e" % x
@@ -202,54 +355,364 @@ def expo(x, fmt="%4.2f", code="#"):
         s = num
     return s
 #------------------------------------------------------------------
+def _hms(seconds):
+    h = int(seconds / 3600)
+    seconds = seconds - 3600*h
+    m = int(seconds / 60)
+    seconds = seconds - 60*m
+    return "%2.2d:%2.2d:%2.2d" % (h, m, seconds)
+
 class TimeLeft:
+    # superseded by Progress
     def __init__(self, ntoys):
         self.ntoys = ntoys
-        self.swatch = ROOT.TStopwatch()
+        self.start = time.time()
     def __del__(self):
         pass
     def __call__(self, ii):
-        swatch = self.swatch
-        ntoys = self.ntoys
-        # elapsed time since start
-        s = swatch.RealTime(); swatch.Continue()
         # time/loop
         loop = ii+1
-        t = s / loop
+        t = (time.time() - self.start) / loop
         # time left
-        s = t * (ntoys-loop)
-        h = int(s / 3600) 
-        s = s - 3600*h
-        m = int(s / 60)
-        s =  s - 60*m
-        rec = "%2.2d:%2.2d:%2.2d hours" % (h, m, s)                             
+        return "%s hours" % _hms(t * (self.ntoys-loop))
+
+class Progress:
+    '''
+    progress = Progress(total, interval=10, units='events', bytesread=None,
+                        out=sys.stdout)
+    for i in range(total):
+        ...
+        progress(i+1)
+    progress.done()
+
+    Report, at most every interval seconds, the number of items done, the
+    rate in items/s and the read rate in MB/s (both averaged over the last
+    few reports), the estimated time left and the wall and CPU time used.
+    Calling progress costs little more than the call itself: the clock is
+    read only every stride calls, where stride is adjusted so that it is
+    read about 100 times per interval. The count defaults to the number
+    of calls. bytesread is a function that returns the number of bytes
+    read so far (default: the bytes read from ROOT files, if ROOT is in
+    use; False: none). The numbers at the last report are available from
+    status().
+    '''
+    def __init__(self, total, interval=10, units='events', bytesread=None,
+                 out=sys.stdout):
+        self.total = total
+        self.interval = interval
+        self.units = units
+        if bytesread == None and 'ROOT' in sys.modules:
+            bytesread = lambda: ROOT.TFile.GetFileBytesRead()
+        elif bytesread is False:
+            bytesread = None
+        self.bytesread = bytesread
+        self.out = out
+        self.eol = '\r' if hasattr(out, 'isatty') and out.isatty() else '\n'
+        self.smoothing = max(3*interval, 1.0)
+
+        self.calls = 0
+        self.stride = 1
+        self.nextcheck = 1
+        self.start = time.time()
+        self.cpustart = time.process_time()
+        self.checktime = self.start
+        self.checkcalls = 0
+        self.lasttime = self.start
+        self.firstcount = self.lastcount = 0
+        self.bytes0 = self.__bytes()
+        self.lastbytes = self.bytes0
+        self.rate = None
+        self.byterate = None
+        self.count = 0
+
+    def __del__(self):
+        pass
+
+    def __call__(self, count=None):
+        self.calls += 1
+        if self.calls < self.nextcheck:
+            return
+        self.__check(count)
+
+    def __bytes(self):
+        if self.bytesread == None:
+            return 0
+        return self.bytesread()
+
+    def __check(self, count):
+        now = time.time()
+        if self.checkcalls == 0:
+            # the first call marks the start; any items counted by then
+            # were done before
+            if count != None:
+                self.firstcount = self.lastcount = count
+            self.checktime = now
+            self.checkcalls = self.calls
+            self.nextcheck = self.calls + 1
+            return
+        # time per call, whence the number of calls between clock readings
+        dt = (now - self.checktime) / (self.calls - self.checkcalls)
+        if dt > 0:
+            self.stride = max(1, min(int(0.01*self.interval/dt), 1000000))
+        self.checktime = now
+        self.checkcalls = self.calls
+        self.nextcheck = self.calls + self.stride
+        if now - self.lasttime >= self.interval:
+            self.update(count, now)
+
+    def update(self, count=None, now=None):
+        # record the numbers now and write a report
+        if count == None:
+            count = self.calls
+        if now == None:
+            now = time.time()
+        dt = now - self.lasttime
+        nbytes = self.__bytes()
+        if self.rate == None:
+            # start with the averages since the start, once there is one
+            if count > self.firstcount:
+                wall = max(now - self.start, 1e-9)
+                self.rate = (count - self.firstcount) / wall
+                self.byterate = (nbytes - self.bytes0) / wall
+        elif dt > 0:
+            # moving averages over about the last smoothing seconds
+            a = 1 - math.exp(-dt / self.smoothing)
+            self.rate = a*(count - self.lastcount)/dt + (1-a)*self.rate
+            self.byterate = a*(nbytes - self.lastbytes)/dt + \
+                (1-a)*self.byterate
+        self.count = count
+        self.lasttime = now
+        self.lastcount = count
+        self.lastbytes = nbytes
+        self.out.write(str(self) + self.eol)
+        self.out.flush()
+
+    def status(self):
+        wall = self.lasttime - self.start
+        cpu = time.process_time() - self.cpustart
+        rate = self.rate or 0.0
+        timeleft = None
+        if self.total and rate > 0:
+            timeleft = max(self.total - self.count, 0) / rate
+        return {'count': self.count, 'total': self.total,
+                'rate': rate,
+                'MBps': (self.byterate or 0.0) / 1.0e6,
+                'MB': (self.lastbytes - self.bytes0) / 1.0e6,
+                'timeleft': timeleft,
+                'wall': wall, 'cpu': cpu}
+
+    def __str__(self):
+        s = self.status()
+        if s['total']:
+            rec = "%10d/%d %5.1f%%" % (s['count'], s['total'],
+                                       100.0*s['count']/s['total'])
+        else:
+            rec = "%10d" % s['count']
+        rec += " %10.1f %s/s" % (s['rate'], self.units)
+        if self.bytesread != None:
+            rec += " %8.2f MB/s" % s['MBps']
+        if s['timeleft'] != None:
+            rec += "  left %s" % _hms(s['timeleft'])
+        rec += "  wall %s  cpu %s" % (_hms(s['wall']), _hms(s['cpu']))
+        return rec
+
+    def done(self, count=None):
+        # write a final report of the totals
+        if count == None:
+            count = self.calls
+        now = time.time()
+        if count != self.count:
+            self.update(count, now)
+        wall = now - self.start
+        cpu = time.process_time() - self.cpustart
+        rate = (count - self.firstcount) / max(wall, 1e-9)
+        rec = "%d %s in %s wall (%.1f %s/s), %s cpu (%.0f%%)" % \
+            (count, self.units, _hms(wall), rate,
+             self.units, _hms(cpu), 100.0*cpu / max(wall, 1e-9))
+        if self.bytesread != None:
+            rec += ", %.1f MB read" % ((self.lastbytes - self.bytes0) / 1.0e6)
+        if self.eol == '\r':
+            self.out.write('\n')
+        self.out.write(rec + '\n')
+        self.out.flush()
+
+# the active Profiler, if any (see Profiler.start)
+_profiler = None
+
+class _Section:
+    # context manager that times a block of code for a Profiler
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+    def __enter__(self):
+        self.start = self.profiler.clock()
+        return self
+    def __exit__(self, *args):
+        self.profiler.record(self.name, self.start)
+        return False
+
+class Profiler:
+    '''
+    prof = Profiler(trace=True, maxevents=1000000)
+    prof.start()
+    ...
+    prof.stop()
+    print(prof)
+    prof.writeTrace('trace.json')
+
+    Record the number of calls and the time spent in the stages of a job
+    while the profiler is active (between start and stop):
+
+       LoadTree, GetEntry, SetBranchAddress  Ntuple reads
+       user      code between Ntuple iterations, i.e., the body of the
+                 loop, including any stages timed within it
+       arrays    Ntuple batch reads (arrays, readEntries)
+       BDT       BDT evaluation
+       fill      filling of histograms made by mkhist1 and mkhist2, or
+                 instrumented with prof.instrument(h)
+
+    Other code can be timed with
+
+        with prof('selection'):
+            ...
+
+    or by wrapping a function, f = prof.wrap('selection', f). If trace
+    is True, the first maxevents timed calls are also kept as a timeline,
+    which writeTrace writes in the Chrome trace format (for viewing with
+    chrome://tracing or Perfetto). Profiling is off, and costs nothing
+    beyond a test, unless a profiler is active.
+    '''
+    def __init__(self, trace=True, maxevents=1000000):
+        self.trace = trace
+        self.maxevents = maxevents
+        self.clock = time.perf_counter
+        self.stats = {}
+        self.events = []
+        self.instrumented = []
+        self.origin = self.clock()
+        self.elapsed = 0.0
+
+    def __del__(self):
+        pass
+
+    def start(self):
+        global _profiler
+        _profiler = self
+        self.started = self.clock()
+        return self
+
+    def stop(self):
+        global _profiler
+        if _profiler is self:
+            _profiler = None
+        self.elapsed += self.clock() - self.started
+        # remove the wrappers added by instrument
+        for obj, method in self.instrumented:
+            try:
+                delattr(obj, method)
+            except:
+                pass
+        self.instrumented = []
+
+    def record(self, name, start, end=None):
+        # record a call to name that started at time start
+        if end == None:
+            end = self.clock()
+        stat = self.stats.get(name)
+        if stat == None:
+            stat = self.stats[name] = [0, 0.0]
+        stat[0] += 1
+        stat[1] += end - start
+        if self.trace and len(self.events) < self.maxevents:
+            self.events.append((name, start, end - start))
+
+    def __call__(self, name):
+        return _Section(self, name)
+
+    def wrap(self, name, function):
+        def timed(*args, **kwargs):
+            start = self.clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(name, start)
+        return timed
+
+    def instrument(self, obj, method='Fill', name='fill'):
+        # time calls of obj.method, e.g., the Fill method of a histogram,
+        # until the profiler is stopped
+        setattr(obj, method, self.wrap(name, getattr(obj, method)))
+        self.instrumented.append((obj, method))
+
+    def summary(self):
+        # list of (name, calls, seconds), most time consuming first
+        recs = [(name, calls, seconds)
+                for name, (calls, seconds) in self.stats.items()]
+        recs.sort(key=lambda x: -x[2])
+        return recs
+
+    def __str__(self):
+        elapsed = self.elapsed
+        if _profiler is self:
+            elapsed += self.clock() - self.started
+        rec = "%-20s %12s %12s %10s %7s\n" % \
+            ('stage', 'calls', 'seconds', 'us/call', 'time')
+        for name, calls, seconds in self.summary():
+            rec += "%-20s %12d %12.4f %10.3f %6.1f%%\n" % \
+                (name, calls, seconds, 1e6*seconds/max(calls, 1),
+                 100.0*seconds/max(elapsed, 1e-9))
+        rec += "%-20s %12s %12.4f" % ('elapsed', '', elapsed)
         return rec
+
+    def writeTrace(self, filename):
+        import json
+        pid = os.getpid()
+        events = [{'name': name, 'ph': 'X', 'pid': pid, 'tid': 0,
+                   'ts': 1e6*(start - self.origin), 'dur': 1e6*duration}
+                  for name, start, duration in self.events]
+        out = open(filename, 'w')
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, out)
+        out.close()
 #------------------------------------------------------------------------------
-class Scribe(ROOT.TLatex):
+class Scribe(object):
+    '''
+    s = Scribe(xpos, ypos, size=TITLE_FONTSIZE, font=TEXTFONT)
+
+    Writes successive lines of text with a TLatex, s.latex, which is
+    created with the Scribe so that importing histutil does not load ROOT.
+    Other TLatex methods, e.g., s.SetTextColor(2), are passed on to
+    s.latex.
+    '''
     def __init__(self, xxpos, yypos, size=TITLE_FONTSIZE, font=TEXTFONT):
-        ROOT.TLatex.__init__(self)
-        self.SetNDC()
-        self.SetTextSize(size)
-        self.SetTextFont(font)
-        self.SetTextAlign(12)
-        
+        self.latex = ROOT.TLatex()
+        self.latex.SetNDC()
+        self.latex.SetTextSize(size)
+        self.latex.SetTextFont(font)
+        self.latex.SetTextAlign(12)
+
         self.xpos = xxpos
         self.ypos = yypos
         self.linewidth = 1.5*size
 
+    def __getattr__(self, name):
+        # called only for names not found on the Scribe
+        if name == 'latex':
+            raise AttributeError(name)
+        return getattr(self.latex, name)
+
     def __del__(self):
         pass
 
     def write(self, text, xoffset=0):
         y = self.ypos
         if y < 0: return
-        self.DrawLatex(self.xpos+xoffset, y, text)
+        self.latex.DrawLatex(self.xpos+xoffset, y, text)
         self.ypos -= self.linewidth
 
     def vspace(self, f=0.5):
         y = self.ypos
         if y < 0: return
-        self.DrawLatex(self.xpos, y, " ")
+        self.latex.DrawLatex(self.xpos, y, " ")
         self.ypos -= self.linewidth * f;
 #------------------------------------------------------------------------------
 def addTitle(title="CMS Preliminary       L = 30fb^{-1}    #sqrt{s}=13TeV",
@@ -423,43 +886,77 @@ def getarg(args, key, d):
     else:
         return d
 #------------------------------------------------------------------------------
+def todoubles(x):
+    '''
+    Return x as a contiguous buffer of doubles suitable for passing to
+    ROOT as a double*. No copy is made if x already is one (a float64
+    numpy array, an array('d') or a buffer of doubles).
+    '''
+    if isinstance(x, array) and x.typecode == 'd':
+        return x
+    try:
+        import numpy as np
+    except ImportError:
+        return array('d', x)
+    return np.ascontiguousarray(x, dtype=np.float64)
+
+def decimate(x, y, xmin, xmax, ncolumns=WIDTH):
+    '''
+    Return the (sorted) indices of the points of the curve (x, y) to be
+    kept when it is drawn across ncolumns pixel columns spanning
+    [xmin, xmax]: the points with the smallest and largest y in each
+    column, plus the first and last points. This keeps the visual shape
+    of the curve while reducing it to at most 2*ncolumns+2 points.
+    '''
+    import numpy as np
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(y)
+    if n <= 2*ncolumns+2:
+        return np.arange(n)
+    width = float(xmax - xmin)
+    if width <= 0:
+        width = 1.0
+    col = ((x - xmin) * (ncolumns / width)).astype(np.int64)
+    np.clip(col, 0, ncolumns-1, out=col)
+
+    # group the points by column (a linear pass when x is sorted)
+    order  = np.argsort(col, kind='stable')
+    scol   = col[order]
+    ys     = y[order]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(scol)) + 1))
+    group  = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+
+    # first point in each column at which y is the column minimum/maximum
+    keep = [[0, n-1]]
+    for extremum in (np.minimum, np.maximum):
+        hits = np.flatnonzero(ys == extremum.reduceat(ys, starts)[group])
+        ghit = group[hits]
+        first = np.concatenate(([True], ghit[1:] != ghit[:-1]))
+        keep.append(order[hits[first]])
+    keep = np.concatenate(keep)
+    return np.unique(keep)
+
 def mkpline(xx, y1, y2, boundary, pad, **args):    
+    import numpy as np
     color  = getarg(args, 'color',   ROOT.kYellow)
     fstyle = getarg(args, 'fstyle',  3001)
     lwidth = getarg(args, 'lwidth',  2)
 
     nbins = len(xx)
 
-    # lower curve
-    x = array('d')
-    if type(xx) == type([]):		
-        x.fromlist(xx)
-    else:
-        for z in xx: x.append(z)
-
-    y = array('d')
-    if type(y1) == type([]):
-        y.fromlist(y1)
-    else:
-        for z in y1: y.append(z)
-
-    # upper curve
-
-    for i in range(nbins):
-        j = nbins - i - 1
-        x.append(xx[j])
-        y.append(y2[j])
-
-    x.append(xx[0])
-    y.append(y1[0])
+    # lower curve, followed by the upper curve in reverse order
+    xx = np.asarray(todoubles(xx))
+    y1 = np.asarray(todoubles(y1))
+    y2 = np.asarray(todoubles(y2))
+    x  = np.concatenate((xx, xx[::-1], xx[:1]))
+    y  = np.concatenate((y1, y2[::-1], y1[:1]))
 
     # clip polygon
-    np  = 2*nbins
-    npp = 2*np
-    xc = array('d')
-    xc.fromlist(npp*[0])
-    yc = array('d')
-    yc.fromlist(npp*[0])
+    npts = 2*nbins
+    npp = 2*npts
+    xc = np.zeros(npp)
+    yc = np.zeros(npp)
 
     if type(boundary) != type([]):
         xmin = boundary.GetBinLowEdge(1)
@@ -469,8 +966,8 @@ def mkpline(xx, y1, y2, boundary, pad, **args):
     else:
         xmin, xmax, ymin, ymax = boundary
 
-    np = pad.ClipPolygon(np, x, y, npp, xc, yc, xmin, ymin, xmax, ymax)
-    pl = ROOT.TPolyLine(np, xc, yc)
+    npts = pad.ClipPolygon(npts, x, y, npp, xc, yc, xmin, ymin, xmax, ymax)
+    pl = ROOT.TPolyLine(npts, xc, yc)
     pl.SetLineColor(color)
     pl.SetLineWidth(lwidth)
     pl.SetFillColor(color)
@@ -488,6 +985,7 @@ def mkhist1(hname, xtitle, ytitle, nbins, xmin, xmax, **args):
     ndivy  = getarg(args, 'ndivy',   510)
 
     h = ROOT.TH1F(hname, "", nbins, xmin, xmax)		
+    if _profiler != None: _profiler.instrument(h)
     h.SetLineColor(color)
     h.SetLineStyle(lstyle)
     h.SetLineWidth(lwidth)
@@ -518,6 +1016,7 @@ def mkhist2(hname, xtitle, ytitle,
     ndivy  = getarg(args, 'ndivy',   505)
 
     h = ROOT.TH2F(hname, "", nbinx, xmin, xmax, nbiny, ymin, ymax)
+    if _profiler != None: _profiler.instrument(h)
     h.SetLineColor(color)
     h.SetMarkerColor(color)
     h.SetMarkerSize(msize)
@@ -564,21 +1063,24 @@ def mkgraph(x, y, xtitle, ytitle, xmin, xmax, **args):
     ndivx  = getarg(args, 'ndivx', 505)
     ndivy  = getarg(args, 'ndivy', 505)
     name   = getarg(args, 'name', None)
+    # reduce the number of points to what the canvas can display:
+    # True for one column per pixel of the default canvas width, or
+    # an integer number of columns
+    ncols  = getarg(args, 'decimate', False)
 
-    if y == None:
+    if y is None:
         g = ROOT.TGraph()
     else:
-        n = len(y)
-        xx = x
-        if type(x) == type([]):
-            xx = array('d')
-            for i in range(n): xx.append(x[i])
-        yy = y	
-        if type(y) == type([]):
-            yy = array('d')
-            for i in range(n): yy.append(y[i])
-
-        g = ROOT.TGraph(n, xx, yy)
+        xx = todoubles(x)
+        yy = todoubles(y)
+        if ncols:
+            if ncols is True: ncols = WIDTH
+            import numpy as np
+            keep = decimate(xx, yy, xmin, xmax, ncols)
+            xx = todoubles(np.asarray(xx)[keep])
+            yy = todoubles(np.asarray(yy)[keep])
+        n  = len(yy)
+        g  = ROOT.TGraph(n, xx, yy)
 
     if name != None: g.SetName(name)
 
@@ -610,25 +1112,19 @@ def mkgraphErrors(x, y, ex, ey, xtitle, ytitle, xmin, xmax, **args):
     lwidth = getarg(args, 'lwidth',  1)
     ndivx  = getarg(args, 'ndivx',   505)
     ndivy  = getarg(args, 'ndivy',   510)
-
-    n = len(y)
-    xx = x
-    if type(x) == type([]):
-        xx = array('d')
-        for i in range(n): xx.append(x[i])
-    yy = y	
-    if type(y) == type([]):
-        yy = array('d')
-        for i in range(n): yy.append(y[i])
-
-    exx = ex
-    if type(ex) == type([]):
-        exx = array('d')
-        for i in range(n): exx.append(ex[i])
-    eyy = ey	
-    if type(ey) == type([]):
-        eyy = array('d')
-        for i in range(n): eyy.append(ey[i])
+    ncols  = getarg(args, 'decimate', False)
+
+    xx  = todoubles(x)
+    yy  = todoubles(y)
+    exx = todoubles(ex)
+    eyy = todoubles(ey)
+    if ncols:
+        if ncols is True: ncols = WIDTH
+        import numpy as np
+        keep = decimate(xx, yy, xmin, xmax, ncols)
+        xx, yy, exx, eyy = [todoubles(np.asarray(z)[keep])
+                            for z in (xx, yy, exx, eyy)]
+    n   = len(yy)
 
     g = ROOT.TGraphErrors(n, xx, yy, exx, eyy)
 
@@ -661,8 +1157,9 @@ def mkcdf(hist, minbin=1):
     c[j] = hist.Integral()
     return c
 
-def mkroc(name, hsig, hbkg, lcolor=ROOT.kBlue, lwidth=2, ndivx=505, ndivy=505):
+def mkroc(name, hsig, hbkg, lcolor=None, lwidth=2, ndivx=505, ndivy=505):
     from array import array
+    if lcolor is None: lcolor = ROOT.kBlue
     csig = mkcdf(hsig); csig = [ c / csig[-1] for c in csig ]
     cbkg = mkcdf(hbkg); cbkg = [ c / cbkg[-1] for c in cbkg ]
     npts = len(csig)
@@ -686,6 +1183,117 @@ def mkroc(name, hsig, hbkg, lcolor=ROOT.kBlue, lwidth=2, ndivx=505, ndivy=505):
     g.GetHistogram().SetNdivisions(ndivy, "Y")
     return g
 
+def bootroc(sig, bkg, nreplicas=1000, **args):
+    '''
+    curve, auc = bootroc(sig, bkg, nreplicas=1000, **args)
+
+    Bootstrap the ROC curve of the scores sig and bkg. Each replica
+    reweights the events with Poisson(1) weights. The scores are sorted
+    once and split into nblocks consecutive blocks; since a sum of
+    Poisson(1) variates is Poisson, each replica draws one Poisson count
+    per block rather than one per event (for weighted events the
+    scaled-Poisson approximation with the same mean and variance is used).
+    Block edges fall only between distinct scores, so events with the
+    same score move the curve diagonally, as a single step (identical
+    signal and background scores give an area of 0.5).
+    The signal efficiency of each replica is evaluated on a common grid of
+    npoints background efficiencies in [0, 1] and added to the returned
+    PercentileCurve, whose plines method draws the 68% and 95% bands.
+    auc is the list of areas under the replica curves.
+
+    optional arguments: wsig, wbkg, npoints=101, nblocks=2000,
+                        batch=100, seed=None
+    '''
+    import numpy as np
+    wsig    = getarg(args, 'wsig',    None)
+    wbkg    = getarg(args, 'wbkg',    None)
+    npoints = getarg(args, 'npoints', 101)
+    nblocks = getarg(args, 'nblocks', 2000)
+    batch   = getarg(args, 'batch',   100)
+    seed    = getarg(args, 'seed',    None)
+
+    sig = np.asarray(sig, dtype=np.float64).ravel()
+    bkg = np.asarray(bkg, dtype=np.float64).ravel()
+    if wsig is None:
+        wsig = np.ones(len(sig))
+    if wbkg is None:
+        wbkg = np.ones(len(bkg))
+    wsig = np.asarray(wsig, dtype=np.float64).ravel()
+    wbkg = np.asarray(wbkg, dtype=np.float64).ravel()
+
+    # single sort of all scores, highest score first
+    scores = np.concatenate((sig, bkg))
+    order  = np.argsort(scores, kind='stable')[::-1]
+    issig  = (np.arange(len(scores)) < len(sig))[order]
+    w      = np.concatenate((wsig, wbkg))[order]
+
+    # sum of weights and of squared weights per block
+    nevents = len(scores)
+    nblocks = max(1, min(nblocks, nevents))
+    edges   = np.unique(np.linspace(0, nevents, nblocks+1).astype(int))[:-1]
+    # move each edge back to the first of the events tied with the event
+    # at the edge, so that no block splits a group of tied scores
+    sortedscores = scores[order]
+    starts = np.flatnonzero(np.concatenate(([True], sortedscores[1:] !=
+                                            sortedscores[:-1])))
+    edges  = np.unique(starts[np.searchsorted(starts, edges, 'right')-1])
+
+    def blocksums(select):
+        ww  = np.where(select, w, 0.0)
+        sw  = np.add.reduceat(ww, edges)
+        sw2 = np.add.reduceat(ww*ww, edges)
+        good  = sw > 0
+        neff  = np.where(good, sw*sw/np.where(good, sw2, 1), 0.0)
+        scale = np.where(good, sw2/np.where(good, sw, 1), 0.0)
+        return neff, scale
+
+    neffs, scales = blocksums(issig)
+    neffb, scaleb = blocksums(~issig)
+
+    rng  = np.random.default_rng(seed)
+    grid = np.linspace(0, 1, npoints)
+    curve = PercentileCurve(npoints)
+    curve.x = list(grid)
+    auc = []
+    nblocks = len(edges)
+    zeros = None
+    for first in range(0, nreplicas, batch):
+        nrep = min(batch, nreplicas - first)
+        if zeros is None or len(zeros) != nrep:
+            zeros = np.zeros((nrep, 1))
+
+        es = np.cumsum(rng.poisson(neffs, (nrep, nblocks)) * scales, axis=1)
+        eb = np.cumsum(rng.poisson(neffb, (nrep, nblocks)) * scaleb, axis=1)
+        es = np.hstack((zeros, es / np.maximum(es[:, -1:], 1e-300)))
+        eb = np.hstack((zeros, eb / np.maximum(eb[:, -1:], 1e-300)))
+
+        # trapezoidal area under each replica curve
+        auc.extend((0.5*np.sum((eb[:, 1:]-eb[:, :-1])*(es[:, 1:]+es[:, :-1]),
+                               axis=1)).tolist())
+        for ii in range(nrep):
+            curve.add(np.interp(grid, eb[ii], es[ii]).tolist())
+    return (curve, auc)
+
+def mkrocbands(name, sig, bkg, pad, nreplicas=1000, **args):
+    '''
+    p50, p68, p95, auc = mkrocbands(name, sig, bkg, pad, nreplicas=1000,
+                                    **args)
+
+    Draw-ready median ROC curve with 68% and 95% bootstrap bands.
+    Arguments are those of bootroc, plus lcolor and lwidth for the median.
+    '''
+    lcolor = getarg(args, 'lcolor', ROOT.kBlue)
+    lwidth = getarg(args, 'lwidth', 2)
+    curve, auc = bootroc(sig, bkg, nreplicas, **args)
+    p50, p68, p95 = curve.plines([0, 1, 0, 1], pad,
+                                     "#font[12]{#epsilon_{b}}",
+                                     "#font[12]{#epsilon_{s}}",
+                                     0, 1)
+    p50.SetName(name)
+    p50.SetLineColor(lcolor)
+    p50.SetLineWidth(lwidth)
+    return (p50, p68, p95, auc)
+
 def mklegend(xx, yy, xw, yw):
     lg = ROOT.TLegend(xx, yy, xx+xw, yy+yw)
     lg.SetFillColor(ROOT.kWhite)
@@ -694,13 +1302,150 @@ def mklegend(xx, yy, xw, yw):
     lg.SetShadowColor(ROOT.kWhite)
     return lg
 #------------------------------------------------------------------------------
+# Batch rendering of many plots
+#------------------------------------------------------------------------------
+_canvases = {}   # canvas pool of the current process, keyed by (width, height)
+
+def _runJobs(function, jobs, nworkers=1, progress=False, units='jobs',
+             initializer=None, initargs=()):
+    # return [function(job) for job in jobs], computed by nworkers
+    # processes if nworkers > 1. If progress is True, or a report interval
+    # in seconds, the progress is reported (see Progress). initializer
+    # sets up each process; if the jobs are run in this process instead,
+    # the function it returns, if any, is called at the end to undo the
+    # set-up.
+    meter = None
+    if progress is not False and progress != None:
+        interval = 10 if progress is True else progress
+        meter = Progress(len(jobs), interval, units, bytesread=False)
+    results = []
+    if meter != None: meter(0)
+    if nworkers > 1:
+        from multiprocessing import Pool
+        pool = Pool(nworkers, initializer, initargs)
+        try:
+            for result in pool.imap(function, jobs):
+                results.append(result)
+                if meter != None: meter(len(results))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        restore = None
+        if initializer != None:
+            restore = initializer(*initargs)
+        try:
+            for job in jobs:
+                results.append(function(job))
+                if meter != None: meter(len(results))
+        finally:
+            if restore != None: restore()
+    if meter != None:
+        meter.done(len(results))
+    return results
+
+def _initBatchWorker(style):
+    # return a function that restores the settings changed here
+    batch = ROOT.gROOT.IsBatch()
+    adddirectory = ROOT.TH1.AddDirectoryStatus()
+    current = ROOT.gStyle.GetName()
+    ROOT.gROOT.SetBatch(True)
+    ROOT.TH1.AddDirectory(False)
+    setStyle(style)
+    def restore():
+        ROOT.gROOT.SetBatch(batch)
+        ROOT.TH1.AddDirectory(adddirectory)
+        previous = ROOT.gROOT.GetStyle(current)
+        if previous: previous.cd()
+    return restore
+
+def _renderPlot(job):
+    outdir, formats, spec = job
+    name    = spec['name']
+    width   = spec.get('width',  WIDTH)
+    height  = spec.get('height', HEIGHT)
+    formats = spec.get('formats', formats)
+
+    start = time.time()
+    key = (width, height)
+    if key not in _canvases:
+        cname = 'histutil_canvas_%dx%d' % key
+        _canvases[key] = ROOT.TCanvas(cname, cname, width, height)
+    canvas = _canvases[key]
+    canvas.cd()
+    canvas.Clear()
+    filenames = []
+    try:
+        # keep whatever the draw function returns alive until saved
+        objects = spec['draw'](canvas, **spec.get('args', {}))
+        canvas.Update()
+        for fmt in formats:
+            filename = os.path.join(outdir, '%s.%s' % (name, fmt))
+            canvas.SaveAs(filename)
+            filenames.append(filename)
+    except Exception as e:
+        print("*** BatchRenderer - ERROR *** plot %s: %s" % (name, e))
+        filenames = []
+    canvas.Clear()
+    objects = None
+    return (name, time.time() - start, filenames)
+
+class BatchRenderer:
+    '''
+    render = BatchRenderer(nworkers=1, formats=('png', 'pdf'), outdir='.',
+                           style='histutil')
+    timings = render(specs, verbose=False, progress=False)
+
+    Render a list of plot specifications in ROOT batch mode. Each spec is
+    a dictionary:
+
+       name     output file name (without extension)
+       draw     function called as draw(canvas, **args); it draws on the
+                canvas and returns the objects to be kept alive until the
+                canvas has been saved. It must be picklable (i.e., defined
+                at module level) if nworkers > 1.
+       args     (optional) keyword arguments for draw
+       width, height, formats (optional) override the defaults
+
+    The plots are rendered by nworkers processes, each of which calls
+    setStyle(style) once and reuses one canvas per size. Returns a list of
+    (name, seconds, filenames) in the order of the specs; filenames is
+    empty if the plot failed. If verbose, the timings are printed; if
+    progress is True, or a report interval in seconds, the progress is
+    reported (see Progress).
+    '''
+    def __init__(self, nworkers=1, formats=('png', 'pdf'), outdir='.',
+                 style='histutil'):
+        self.nworkers = nworkers
+        self.formats  = formats
+        self.outdir   = outdir
+        self.style    = style
+
+    def __del__(self):
+        pass
+
+    def __call__(self, specs, verbose=False, progress=False):
+        if not os.path.exists(self.outdir):
+            os.makedirs(self.outdir)
+        jobs = [(self.outdir, self.formats, spec) for spec in specs]
+        timings = _runJobs(_renderPlot, jobs, self.nworkers, progress, 'plots',
+                           _initBatchWorker, (self.style,))
+
+        if verbose:
+            total = 0.0
+            for name, seconds, filenames in timings:
+                total += seconds
+                status = '' if filenames else '\tFAILED'
+                print("%-40s %8.3f s%s" % (name, seconds, status))
+            print("%-40s %8.3f s" % ('total', total))
+        return timings
+#------------------------------------------------------------------------------
 class Row:
     def __init__(self, rownumber, varmap, data):
         self.row = rownumber
         self.varmap= varmap
         self.data  = data
-        self.items = map(lambda x: (x[1],x[0]), self.varmap.items())
-        self.items.sort()
+        self.items = sorted([(x[1], x[0]) for x in self.varmap.items()])
 
         # Initialize row counter
         self.col = 0
@@ -710,7 +1455,7 @@ class Row:
         pass
 
     def __call__(self, variable):
-        if not self.varmap.has_key(variable): return None
+        if variable not in self.varmap: return None
         index = self.varmap[variable]
         if len(index) == 1:
             return self.data[index[0]]
@@ -731,13 +1476,13 @@ class Row:
                 elif type(v) == type(""):
                     strvalue += "%12s" % v
                 strrep += "%4d %-16s %s\n" % (ii, name, strvalue)
-        return strip(strrep)
+        return str.strip(strrep)
 
     # Implement Python iterator protocol	
     def __iter__(self):
         return self
 
-    def next(self):
+    def __next__(self):
         if self.col > self.maxcol:
             self.col = 0
             raise StopIteration
@@ -761,12 +1506,83 @@ class Row:
 
 def tonumber(x):
     try:
-        y = atof(x)
+        y = float(x)
     except:
         y = x
     return y
 
-class Table:
+def _tableHeader(record):
+    # Read header and check for array variables.
+    # An array variable is identified by the syntax "name number"
+    # Expand header by replicating the name appending to it an number
+    t = str.split(record)
+
+    varname= []
+    header = []
+    varmap = {}
+    i = 0
+    while i < len(t):
+        name = t[i] # should be a name
+        try:
+            size = int(name)
+            sys.exit('** wrong header syntax\n'\
+                     '** found an integer in column %d where a string was '\
+                     'expected\n' % i)
+        except:
+            pass
+        
+        # check if this is an array variable by looking ahead
+        size = 1
+        array_type = False
+        if i < len(t)-1:
+            try:
+                size = int(t[i+1])
+                array_type = True
+            except:
+                pass
+
+        if array_type:
+            # this is an array variable so expand header names
+            # (if size > 1),
+            # but first cache starting position of array
+            # and its size
+            varmap[name] = []
+            if size > 1:
+                varmap[name] = [len(header),
+                                len(header)+size-1]
+                for j in range(size):
+                    newname = '%s[%d]' % (name, j)
+                    header.append(newname)
+            else:
+                varmap[name] = [len(header)]
+                header.append(name)
+            i += 2
+        else:
+            # this is scalar variable so just add it to the
+            # header as-is
+            varmap[name] = [len(header)]
+            header.append(name)
+            i += 1
+        # cache original names and size
+        varname.append((name, size))
+    return (varname, header, varmap)
+
+class _ArrayReader:
+    # batch reads shared by Table and Ntuple, which provide size() and
+    # arrays(variables, first, nrows)
+
+    def batches(self, variables=None, batchsize=100000):
+        '''
+        for data in t.batches(variables=None, batchsize=100000):
+            ...
+
+        Read the given variables (default: all) batchsize rows at a time,
+        each batch a dictionary of numpy arrays as returned by arrays().
+        '''
+        for first in range(0, self.size(), batchsize):
+            yield self.arrays(variables, first, batchsize)
+
+class Table(_ArrayReader):
 
     def __init__(self, filename, nrows=-1):
         try:
@@ -774,62 +1590,9 @@ class Table:
         except:
             sys.exit("*** can't read file %s" % filename)
 
-        # Read header and check for array variables.
-        # An array variable is identified by the syntax "name number"
-        # Expand header by replicating the name appending to it an number
-        
         records = myfile.readlines()
-        t = split(records[0])
-        
-        self.varname= []
-        self.header = []
-        self.varmap = {}
-        i = 0
-        while i < len(t):
-            name = t[i] # should be a name
-            try:
-                size = atoi(name)
-                sys.exit('** wrong header syntax\n'\
-                         '** found an integer in column %d where a string was '\
-                         'expected\n' % i)
-            except:
-                pass
-            
-            # check if this is an array variable by looking ahead
-            size = 1
-            array_type = False
-            if i < len(t)-1:
-                try:
-                    size = atoi(t[i+1])
-                    array_type = True
-                except:
-                    pass
-
-            if array_type:
-                # this is an array variable so expand header names
-                # (if size > 1),
-                # but first cache starting position of array
-                # and its size
-                self.varmap[name] = []
-                if size > 1:
-                    self.varmap[name] = [len(self.header),
-                                         len(self.header)+size-1]
-                    for j in range(size):
-                        newname = '%s[%d]' % (name, j)
-                        self.header.append(newname)
-                else:
-                    self.varmap[name] = [len(self.header)]
-                    self.header.append(name)
-                i += 2
-            else:
-                # this is scalar variable so just add it to the
-                # header as-is
-                self.varmap[name] = [len(self.header)]
-                self.header.append(name)
-                i += 1
-            # cache original names and size
-            self.varname.append((name, size))
-            
+        self.varname, self.header, self.varmap = _tableHeader(records[0])
+
         ## # print some stuff
         ## print 
         ## lname = ''
@@ -848,7 +1611,7 @@ class Table:
         index = 1
         for record in records[1:]:
             # Convert to numbers
-            record = map(tonumber, split(record))
+            record = list(map(tonumber, str.split(record)))
             self.data.append(record)
             rownumber += 1
             if nrows > 0:
@@ -860,6 +1623,10 @@ class Table:
         self.rownumber = 0
         self.maxrow = len(self.data)-1
         self.maxcol = len(self.header)-1
+
+        # the data as a 2-D numpy array, made when first needed, or False
+        # if they are not all numbers (see arrays)
+        self.matrix = None
         
         # Create a name to index map for rows
         self.rowmap = {} # empty map
@@ -875,7 +1642,7 @@ class Table:
         if variable == None:
             return Row(rownumber, self.varmap, self.data[rownumber])
         else:
-            if not self.varmap.has_key(variable): return None
+            if variable not in self.varmap: return None
             index = self.varmap[variable]
             if len(index) == 1:
                 return self.data[rownumber][index[0]]
@@ -886,7 +1653,7 @@ class Table:
     def __iter__(self):
         return self
 
-    def next(self):
+    def __next__(self):
         if self.rownumber > self.maxrow:
             self.rownumber = 0
             raise StopIteration
@@ -908,6 +1675,52 @@ class Table:
     def numRows(self):
         return self.maxrow+1
 
+    def size(self):
+        return self.numRows()
+
+    def arrays(self, variables=None, first=0, nrows=None):
+        '''
+        data = table.arrays(variables=None, first=0, nrows=None)
+
+        Return the given variables (default: all) for rows first to
+        first+nrows-1 (default: to the last row) as a dictionary of numpy
+        arrays keyed by variable name, as does Ntuple.arrays: scalars give
+        1-D arrays and array variables 2-D arrays. Variables whose values
+        are not all numbers give arrays of strings.
+        '''
+        import numpy as np
+        if variables == None:
+            variables = [name for name, size in self.varname]
+        last = self.numRows()
+        if nrows != None:
+            last = min(first + nrows, last)
+        first = min(first, last)
+
+        if self.matrix is None:
+            try:
+                self.matrix = np.array(self.data, dtype=np.float64)
+            except ValueError:
+                # strings, or rows of different lengths
+                self.matrix = False
+
+        data = {}
+        for name in variables:
+            if name not in self.varmap:
+                sys.exit("** Table.arrays ** unknown variable %s" % name)
+            index = self.varmap[name]
+            columns = slice(index[0], index[-1]+1)
+            if self.matrix is not False:
+                values = self.matrix[first:last, columns]
+            else:
+                values = np.array([row[columns]
+                                   for row in self.data[first:last]])
+            if len(index) == 1:
+                shape = (last-first,)
+            else:
+                shape = (last-first, index[1]-index[0]+1)
+            data[name] = np.ascontiguousarray(values).reshape(shape)
+        return data
+
     def numColumns(self):
         return len(self.header)
 
@@ -919,39 +1732,784 @@ class Table:
         if key < -(self.maxrow+1): return None
         if key > self.maxrow: return None
         return Row(key, self.varmap, self.data[key])
+
+def table2root(textfile, rootfile, treename='Table', chunksize=100000,
+               compression=None):
+    '''
+    n = table2root(textfile, rootfile, treename='Table', chunksize=100000,
+                   compression=None)
+
+    Convert a text file in the format read by Table to a tree in a ROOT
+    file, so that it need not be parsed again, and return the number of
+    rows written. The file is read and parsed chunksize rows at a time
+    and each chunk is filled into the tree in one compiled loop, so files
+    larger than memory can be converted. Each variable becomes a branch
+    of doubles of the same name (a fixed length array for array
+    variables); variables whose values, in the first row, are not numbers
+    are skipped. For compression, see Ntuple.writeSkim. Ntuple.arrays
+    returns the same arrays for the tree as Table.arrays for the text.
+    '''
+    import numpy as np
+    from itertools import islice
+    try:
+        inp = open(textfile, 'r')
+    except:
+        sys.exit("*** can't read file %s" % textfile)
+    varname, header, varmap = _tableHeader(inp.readline())
+    lines = list(islice(inp, chunksize))
+    firstrow = str.split(lines[0]) if len(lines) > 0 else []
+
+    # columns of the variables that are numbers
+    variables = []
+    usecols = []
+    for name, size in varname:
+        index = varmap[name]
+        columns = list(range(index[0], index[-1]+1))
+        try:
+            [float(firstrow[i]) for i in columns]
+        except (ValueError, IndexError):
+            print("** table2root ** skipping %s" % name)
+            continue
+        variables.append((name, len(index) > 1, len(columns)))
+        usecols += columns
+    if len(usecols) == 0:
+        sys.exit("** table2root ** no numeric variables in %s" % textfile)
+
+    _declareReaders()
+    setting = _compressionSetting(compression)
+    if setting == None:
+        fout = ROOT.TFile(rootfile, "RECREATE")
+    else:
+        fout = ROOT.TFile(rootfile, "RECREATE", "", setting)
+    fout.cd()
+    tree = ROOT.TTree(treename, nameonly(textfile))
+
+    # the values of a row, in the order of the columns read, to which the
+    # branches point
+    buffer = np.zeros(len(usecols), dtype=np.float64)
+    offset = 0
+    for name, isarray, size in variables:
+        if isarray:
+            leaf = '%s[%d]/D' % (name, size)
+        else:
+            leaf = '%s/D' % name
+        tree.Branch(name, buffer[offset:offset+size], leaf)
+        offset += size
+
+    nrows = 0
+    while len(lines) > 0:
+        rows = np.loadtxt(lines, dtype=np.float64, usecols=usecols,
+                          ndmin=2)
+        rows = np.ascontiguousarray(rows)
+        ROOT.histutil_fillRows(tree, buffer, len(usecols), rows, len(rows))
+        nrows += len(rows)
+        lines = list(islice(inp, chunksize))
+    inp.close()
+
+    fout.cd()
+    tree.Write("", ROOT.TObject.kOverwrite)
+    fout.Close()
+    return nrows
+#------------------------------------------------------------------------------
+def _addressof(obj, name):
+    # address of data member name of obj, in a form SetBranchAddress accepts
+    if hasattr(ROOT, 'addressof'):
+        from ctypes import c_void_p
+        return c_void_p(ROOT.addressof(obj, name))
+    return ROOT.AddressOf(obj, name)
+
+def _vectordepth(tname):
+    # number of nested vectors in a type name and the element type
+    # e.g., vector<vector<float> > => (2, 'float')
+    depth = 0
+    tname = str.strip(tname)
+    while tname[:7] == 'vector<':
+        tname = str.strip(tname[7:-1])
+        depth += 1
+    return (depth, tname)
+
+def _vectorview(v):
+    # zero-copy numpy view of a std::vector, or a list of views of the
+    # inner vectors of a std::vector<std::vector<T> >. The views are valid
+    # until the next entry is read.
+    import numpy as np
+    if hasattr(v, '__array_interface__'):
+        return np.asarray(v)
+    if str.count(type(v).__cpp_name__, 'vector') > 1:
+        return [_vectorview(x) for x in v]
+    # e.g., std::vector<bool>, which does not expose its data
+    return np.array(list(v))
+
+# struct module format characters of the leaf types
+_FORMATS = {'Char_t': 'b', 'UChar_t': 'B', 'Short_t': 'h', 'UShort_t': 'H',
+            'Int_t': 'i', 'UInt_t': 'I', 'Long_t': 'l', 'ULong_t': 'L',
+            'Long64_t': 'q', 'ULong64_t': 'Q', 'Float_t': 'f',
+            'Float16_t': 'f', 'Double_t': 'd', 'Double32_t': 'd',
+            'Bool_t': '?'}
+
+def _accessor(obj, name, tname, maxcount):
+    # function event -> value of the data member name of the struct obj,
+    # which reads the member through a typed memoryview of its memory
+    # rather than through a PyROOT attribute lookup. Arrays are returned
+    # as a numpy view of the member.
+    import ctypes, struct
+    fmt = _FORMATS.get(tname, None)
+    if fmt == None or fmt == 'b' or not hasattr(ROOT, 'addressof'):
+        # unknown type, or a Char_t, which PyROOT returns as a string
+        return lambda event: getattr(obj, name)
+    size = struct.calcsize(fmt) * maxcount
+    memory = (ctypes.c_char * size).from_address(ROOT.addressof(obj, name))
+    view = memoryview(memory).cast('B').cast(fmt)
+    if maxcount == 1:
+        return lambda event: view[0]
+    import numpy as np
+    array = np.frombuffer(view, dtype=np.dtype(fmt))
+    return lambda event: array
+
+def _vectorAccessor(v):
+    # function event -> zero-copy view of the std::vector v
+    if hasattr(v, '__array_interface__'):
+        import numpy as np
+        return lambda event: np.asarray(v)
+    return lambda event: _vectorview(v)
+
+class Jagged:
+    '''
+    a = Jagged(offsets, content)
+
+    An array of variable length arrays, one per event, stored as a flat
+    array content and len(a)+1 offsets: the values for event i are
+    content[offsets[i]:offsets[i+1]]. content may itself be a Jagged array
+    (e.g., for vector<vector<float> > branches).
+
+    Arithmetic and comparisons apply to the values, with numbers and
+    arrays of a value per event broadcast to each value of the event
+    (see deltaPhi).
+    '''
+    # make NumPy leave operations with Jagged arrays to Jagged
+    __array_ufunc__ = None
+
+    def __init__(self, offsets, content):
+        self.offsets = offsets
+        self.content = content
+
+    def __del__(self):
+        pass
+
+    def __len__(self):
+        return len(self.offsets)-1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                raise IndexError("Jagged: only contiguous slices supported")
+            stop = max(start, stop)
+            offsets = self.offsets[start:stop+1]
+            return Jagged(offsets - offsets[0],
+                          self.content[offsets[0]:offsets[-1]])
+        if i < 0: i += len(self)
+        return self.content[self.offsets[i]:self.offsets[i+1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __str__(self):
+        return "Jagged(%d events, %d values)" % (len(self), len(self.content))
+
+    def counts(self):
+        import numpy as np
+        return np.diff(self.offsets)
+
+    def filter(self, mask):
+        # Jagged array of the values for which the Jagged array mask is
+        # True, e.g., jet_pt.filter(jet_pt > 30)
+        import numpy as np
+        if isinstance(mask, Jagged):
+            mask = mask.content
+        mask = np.asarray(mask, dtype=bool)
+        # number of values kept before each position
+        kept = np.zeros(len(mask)+1, dtype=np.int64)
+        np.cumsum(mask, out=kept[1:])
+        return Jagged(kept[self.offsets], self.content[mask])
+
+    def sum(self):
+        # sum of the values of each event
+        import numpy as np
+        result = np.zeros(len(self), dtype=np.result_type(self.content, 0))
+        np.add.at(result, np.repeat(np.arange(len(self)), self.counts()),
+                  self.content)
+        return result
+
+    def any(self):
+        return self.sum() > 0
+
+    def __neg__(self): return Jagged(self.offsets, -self.content)
+    def __abs__(self): return Jagged(self.offsets, abs(self.content))
+    def __add__(self, x): return _apply(lambda a, b: a + b, self, x)
+    def __radd__(self, x): return _apply(lambda a, b: b + a, self, x)
+    def __sub__(self, x): return _apply(lambda a, b: a - b, self, x)
+    def __rsub__(self, x): return _apply(lambda a, b: b - a, self, x)
+    def __mul__(self, x): return _apply(lambda a, b: a * b, self, x)
+    def __rmul__(self, x): return _apply(lambda a, b: b * a, self, x)
+    def __truediv__(self, x): return _apply(lambda a, b: a / b, self, x)
+    def __rtruediv__(self, x): return _apply(lambda a, b: b / a, self, x)
+    def __pow__(self, x): return _apply(lambda a, b: a ** b, self, x)
+    def __lt__(self, x): return _apply(lambda a, b: a < b, self, x)
+    def __le__(self, x): return _apply(lambda a, b: a <= b, self, x)
+    def __gt__(self, x): return _apply(lambda a, b: a > b, self, x)
+    def __ge__(self, x): return _apply(lambda a, b: a >= b, self, x)
+    def __eq__(self, x): return _apply(lambda a, b: a == b, self, x)
+    def __ne__(self, x): return _apply(lambda a, b: a != b, self, x)
+    # element-wise == makes Jagged arrays unhashable
+    __hash__ = None
+    def __and__(self, x): return _apply(lambda a, b: a & b, self, x)
+    def __or__(self, x): return _apply(lambda a, b: a | b, self, x)
+    def __invert__(self): return Jagged(self.offsets, ~self.content)
+
+    def take(self, indices):
+        # Jagged array of the events with the given indices
+        import numpy as np
+        indices = np.asarray(indices, dtype=np.int64)
+        counts  = self.counts()[indices]
+        offsets = np.zeros(len(indices)+1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        starts  = self.offsets[:-1][indices]
+        # position in content of each value of the selected events
+        where = np.repeat(starts - offsets[:-1], counts) + \
+            np.arange(offsets[-1])
+        return Jagged(offsets, self.content.take(where))
 #------------------------------------------------------------------------------
 class Buffer:
+    '''
+    event = Buffer(buffer, buffermap, variable, vectors=None, accessors=None)
 
-    def __init__(self, buffer, buffermap, variable):
+    The variables of the current entry of an ntuple, e.g., event.pt. If
+    accessors (a map of variable name to a function event -> value) is
+    given, each variable is a property of the event's class that calls its
+    accessor directly, otherwise each access looks the variable up by name.
+    '''
+    def __init__(self, buffer, buffermap, variable, vectors=None,
+                 accessors=None):
         self.buffer = buffer
         self.buffermap = buffermap
         self.variable = variable
+        # underscored so as not to hide variables with the same names
+        if vectors == None: vectors = {}
+        self._vectors = vectors
+        self._accessors = accessors
+        if accessors != None:
+            # each event gets its own class so that properties can be
+            # added for the variables of its ntuple
+            self.__class__ = type('Buffer', (Buffer,), {})
+            self._addAccessors()
+
+    def _addAccessors(self):
+        # add a property for each accessor not yet known, unless its name
+        # is taken by an attribute of the buffer
+        cls = self.__class__
+        for name, get in self._accessors.items():
+            if name in self.__dict__ or hasattr(cls, name):
+                continue
+            setattr(cls, name, property(get))
 
     def __getattr__(self, variable):
         if variable in self.buffermap:
             jj = self.buffermap[variable]
             return self.buffer[jj].__getattribute__(variable)
+        elif variable in self._vectors:
+            return _vectorview(self._vectors[variable])
         else:
             raise AttributeError(variable)
 
     def __call__(self, variable):
+        if self._accessors != None and variable in self._accessors:
+            return self._accessors[variable](self)
         return self.__getattr__(variable)
     
     def __str__(self):
         s = 'Event variables:\n'
         for tname, name, maxcount in self.variable:
             s += "  %-12s %-24s:\t" % (tname, name)
-            s += "%s\n" % self.__getattr__(name)
+            s += "%s\n" % self(name)
         return s
+#------------------------------------------------------------------------------
+# C++ functions for reading a branch of a tree into flat arrays.
+# T is the type of the branch (or its elements), U the type in which the
+# values are stored (U differs from T only for bool, since std::vector<bool>
+# does not provide access to its data). If entries is not null, the entries
+# read are entries[first]...entries[last-1], otherwise first...last-1.
+_READERS = '''
+#include <vector>
+#include "TTree.h"
+#include "TChain.h"
+#include "TEntryList.h"
+#include "TTreeReader.h"
+#include "TTreeReaderValue.h"
+#include "TTreeReaderArray.h"
+
+template <typename F>
+void histutil_loop(TTreeReader& reader, Long64_t first, Long64_t last,
+                   const Long64_t* entries, F fill)
+{
+  if ( entries )
+    for(Long64_t i=first; i < last; i++)
+      {
+        reader.SetEntry(entries[i]);
+        fill();
+      }
+  else
+    {
+      reader.SetEntriesRange(first, last);
+      while ( reader.Next() ) fill();
+    }
+}
+
+template <typename T, typename U>
+void histutil_readValues(TTree* tree, const char* name,
+                         Long64_t first, Long64_t last,
+                         const Long64_t* entries,
+                         std::vector<U>& content)
+{
+  TTreeReader reader(tree);
+  TTreeReaderValue<T> value(reader, name);
+  content.reserve(last-first);
+  histutil_loop(reader, first, last, entries,
+                [&]() { content.push_back(*value); });
+}
+
+template <typename T, typename U>
+void histutil_readArrays(TTree* tree, const char* name,
+                         Long64_t first, Long64_t last,
+                         const Long64_t* entries,
+                         std::vector<Long64_t>& offsets,
+                         std::vector<U>& content)
+{
+  TTreeReader reader(tree);
+  TTreeReaderArray<T> values(reader, name);
+  offsets.reserve(last-first+1);
+  offsets.push_back(0);
+  histutil_loop(reader, first, last, entries,
+                [&]()
+                {
+                  size_t n = values.GetSize();
+                  for(size_t i=0; i < n; i++) content.push_back(values[i]);
+                  offsets.push_back(content.size());
+                });
+}
+
+template <typename T, typename U>
+void histutil_readNested(TTree* tree, const char* name,
+                         Long64_t first, Long64_t last,
+                         const Long64_t* entries,
+                         std::vector<Long64_t>& offsets,
+                         std::vector<Long64_t>& offsets2,
+                         std::vector<U>& content)
+{
+  TTreeReader reader(tree);
+  TTreeReaderValue<std::vector<std::vector<T> > > values(reader, name);
+  offsets.reserve(last-first+1);
+  offsets.push_back(0);
+  offsets2.push_back(0);
+  histutil_loop(reader, first, last, entries,
+                [&]()
+                {
+                  for(size_t i=0; i < values->size(); i++)
+                    {
+                      const std::vector<T>& v = (*values)[i];
+                      for(size_t j=0; j < v.size(); j++)
+                        content.push_back(v[j]);
+                      offsets2.push_back(content.size());
+                    }
+                  offsets.push_back(offsets2.size()-1);
+                });
+}
+
+// entry numbers (global for a chain) of the entries in an entry list
+void histutil_entryList(TTree* tree, TEntryList* elist,
+                        std::vector<Long64_t>& entries)
+{
+  tree->SetEntryList(elist);
+  Long64_t n = elist->GetN();
+  entries.reserve(n);
+  for(Long64_t i=0; i < n; i++) entries.push_back(tree->GetEntryNumber(i));
+  tree->SetEntryList(0);
+}
+
+// entry numbers of the entries with the given index values (see
+// TTree::BuildIndex), -1 if not found
+void histutil_findEntries(TTree* tree,
+                          const Long64_t* major, const Long64_t* minor,
+                          Long64_t n, Long64_t* entries)
+{
+  for(Long64_t i=0; i < n; i++)
+    entries[i] = tree->GetEntryNumberWithIndex(major[i], minor[i]);
+}
+
+// copy the given entries of a tree to its clone
+void histutil_copyEntries(TTree* tree, TTree* clone,
+                          const Long64_t* entries, Long64_t n)
+{
+  for(Long64_t i=0; i < n; i++)
+    {
+      tree->GetEntry(entries[i]);
+      clone->Fill();
+    }
+}
+
+// fill a tree whose branches point into buffer with n rows of ncolumns
+// values each
+void histutil_fillRows(TTree* tree, double* buffer, Long64_t ncolumns,
+                       const double* rows, Long64_t n)
+{
+  for(Long64_t i=0; i < n; i++)
+    {
+      std::copy(rows + i*ncolumns, rows + (i+1)*ncolumns, buffer);
+      tree->Fill();
+    }
+}
+'''
+_readersDeclared = False
+
+def _declareReaders():
+    global _readersDeclared
+    if not _readersDeclared:
+        ROOT.gInterpreter.Declare(_READERS)
+        _readersDeclared = True
+
+# ROOT compression algorithms and their default levels
+_COMPRESSION = {'ZLIB': (1, 1), 'LZMA': (2, 7), 'LZ4': (4, 4), 'ZSTD': (5, 5)}
+
+def _compressionSetting(compression):
+    # compression: None, a ROOT compression setting (100*algorithm+level)
+    # or a string "algorithm[:level]", e.g., "ZSTD:5" or "LZ4"
+    if compression == None or type(compression) == type(1):
+        return compression
+    name, sep, level = str.partition(str.upper(compression), ':')
+    if name not in _COMPRESSION:
+        sys.exit("** unknown compression algorithm %s" % name)
+    algorithm, default = _COMPRESSION[name]
+    if level == '':
+        level = default
+    return 100*algorithm + int(level)
+
+def _skimFile(job):
+    # copy selected entries and branches of the tree in one file to a new
+    # file. selection is None (all entries), a cut or an array of entries;
+    # only the first maxentries entries are considered.
+    import numpy as np
+    infile, treename, outfile, branches, selection, setting, basketsize, \
+        maxentries = job
+    _declareReaders()
+    fin  = ROOT.TFile.Open(infile)
+    tree = fin.Get(treename)
+    if branches != None:
+        tree.SetBranchStatus('*', 0)
+        for name in branches:
+            tree.SetBranchStatus(name, 1)
+
+    if setting == None:
+        # keep the compression of the input
+        setting = fin.GetCompressionSettings()
+        samecompression = True
+    else:
+        samecompression = setting == fin.GetCompressionSettings()
+    fout = ROOT.TFile(outfile, "RECREATE", "", setting)
+    fout.cd()
+
+    if type(selection) == type(""):
+        listname = "histutil_skim"
+        tree.Draw(">>%s" % listname, selection, "entrylist", maxentries, 0)
+        elist = ROOT.gDirectory.Get(listname)
+        entries = ROOT.std.vector('Long64_t')()
+        ROOT.histutil_entryList(tree, elist, entries)
+        ROOT.gDirectory.Delete(listname)
+        selection = np.array(entries, dtype=np.int64)
+    elif selection is None and maxentries < tree.GetEntries():
+        selection = np.arange(maxentries, dtype=np.int64)
+
+    if selection is None and basketsize == None and samecompression:
+        # copy the baskets without decompressing them
+        clone = tree.CloneTree(-1, "fast")
+    else:
+        clone = tree.CloneTree(0)
+        if basketsize != None:
+            clone.SetBasketSize('*', basketsize)
+        if selection is None:
+            clone.CopyEntries(tree)
+        else:
+            entries = np.ascontiguousarray(selection).view(np.longlong)
+            # no entries pass: write an empty tree
+            if len(entries) > 0:
+                ROOT.histutil_copyEntries(tree, clone, entries, len(entries))
+    nentries = clone.GetEntries()
+    fout.cd()
+    clone.Write("", ROOT.TObject.kOverwrite)
+    fout.Close()
+    fin.Close()
+    return (outfile, nentries)
+
+def _cachedir(name):
+    # directory for files cached by histutil (default ~/.histutil)
+    top = os.environ.get('HISTUTIL_CACHE',
+                         os.path.join(os.path.expanduser('~'), '.histutil'))
+    path = os.path.join(top, name)
+    if not os.path.exists(path):
+        os.makedirs(path)
+    return path
+
+def _restore(obj, saved):
+    # set the state of the accumulator obj to that of saved in place, so
+    # that references to obj remain valid
+    import numpy as np
+    if hasattr(obj, 'IsA') and obj.InheritsFrom('TH1'):
+        obj.Reset()
+        obj.Add(saved)
+        obj.SetEntries(saved.GetEntries())
+    elif isinstance(obj, dict):
+        obj.clear()
+        obj.update(saved)
+    elif isinstance(obj, list):
+        obj[:] = saved
+    elif isinstance(obj, np.ndarray):
+        obj[...] = saved
+    elif hasattr(obj, '__dict__'):
+        obj.__dict__.clear()
+        obj.__dict__.update(saved.__dict__)
+    else:
+        sys.exit("** Checkpoint ** can't restore object of type %s" % \
+                 type(obj).__name__)
+
+class Checkpoint:
+    '''
+    ck = Checkpoint(filename, interval=300, **accumulators)
+
+    Periodically record the state of a long job, e.g., its loop counter,
+    together with the accumulators (histograms, PercentileCurves, dicts,
+    lists or numpy arrays of counters) given by name, so that a restarted
+    job can resume from where it left off. Counters must be held in a
+    mutable object, e.g., counts = {'passed': 0}.
+
+        state = ck.load()       # None, or the last state saved
+        for i in range(start, n):
+            ...
+            ck(i=i+1)           # save {'i': i+1} if interval seconds
+                                # have elapsed since the last save
+        ck.remove()
+
+    load() restores the accumulators in place. The checkpoint file is
+    replaced atomically, so a job killed while saving leaves the previous
+    checkpoint intact. See also Ntuple.checkpoint.
+    '''
+    def __init__(self, filename, interval=300, **accumulators):
+        self.filename = filename
+        self.interval = interval
+        self.accumulators = accumulators
+        self.lastsave = time.time()
+
+    def __del__(self):
+        pass
+
+    def register(self, name, obj):
+        self.accumulators[name] = obj
+
+    def __call__(self, key=None, **state):
+        if time.time() - self.lastsave < self.interval:
+            return False
+        self.save(key, **state)
+        return True
+
+    def save(self, key=None, **state):
+        import pickle
+        record = {'key': key, 'state': state,
+                  'accumulators': self.accumulators}
+        tmpfile = '%s.tmp' % self.filename
+        out = open(tmpfile, 'wb')
+        pickle.dump(record, out, pickle.HIGHEST_PROTOCOL)
+        out.close()
+        os.replace(tmpfile, self.filename)
+        self.lastsave = time.time()
+
+    def load(self, key=None):
+        # return the saved state, or None if there is no checkpoint or it
+        # was made with a different key (e.g., for different input files)
+        import pickle
+        if not os.path.exists(self.filename):
+            return None
+        record = pickle.load(open(self.filename, 'rb'))
+        if record['key'] != key:
+            print("** Checkpoint ** %s does not match this job; "\
+                  "ignored" % self.filename)
+            return None
+        for name, obj in self.accumulators.items():
+            if name not in record['accumulators']:
+                sys.exit("** Checkpoint ** %s not in %s" % \
+                         (name, self.filename))
+            _restore(obj, record['accumulators'][name])
+        self.lastsave = time.time()
+        return record['state']
+
+    def remove(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+_MEMOSIZE = 1024**3       # default size (bytes) of the cache of cached()
+_filehashes = {}          # content hashes, keyed by (file, size, mtime)
+
+def _fileKey(fname, hashfiles):
+    # identify the version of a file by its size and modification time or,
+    # if hashfiles, its contents (hashed once per version)
+    import hashlib
+    fname = os.path.abspath(fname)
+    version = (fname, os.path.getsize(fname), os.path.getmtime(fname))
+    if not hashfiles:
+        return version
+    if version not in _filehashes:
+        h = hashlib.sha1()
+        inp = open(fname, 'rb')
+        for block in iter(lambda: inp.read(1 << 20), b''):
+            h.update(block)
+        inp.close()
+        _filehashes[version] = h.hexdigest()
+    return (fname, _filehashes[version])
+
+def _inputFiles(args):
+    # the names of existing files among the (possibly nested) arguments
+    fnames = []
+    for arg in args:
+        if isinstance(arg, str):
+            if os.path.isfile(arg):
+                fnames.append(arg)
+        elif isinstance(arg, (list, tuple)):
+            fnames += _inputFiles(arg)
+        elif isinstance(arg, dict):
+            fnames += _inputFiles(arg.values())
+    return fnames
+
+def _evict(path, maxsize):
+    # remove the least recently used entries until the cache is no larger
+    # than maxsize bytes
+    entries = []
+    for fname in glob(os.path.join(path, '*.pkl')):
+        try:
+            entries.append((os.path.getmtime(fname),
+                            os.path.getsize(fname), fname))
+        except OSError:
+            pass
+    total = sum([size for mtime, size, fname in entries])
+    entries.sort()
+    for mtime, size, fname in entries:
+        if total <= maxsize:
+            break
+        try:
+            os.remove(fname)
+        except OSError:
+            pass
+        total -= size
+
+def cached(function=None, files=(), hashfiles=False, maxsize=None):
+    '''
+    @cached
+    def f(...): ...
+
+    @cached(files=(), hashfiles=False, maxsize=None)
+    def f(...): ...
+
+    Cache the results of f on disk (see HISTUTIL_CACHE), keyed by the
+    code of f, its arguments (which must be picklable; ROOT objects are)
+    and the version of its input files, so that a call that has been made
+    before, with the same inputs, returns a copy of the earlier result at
+    once. The input files are the arguments that are names of existing
+    files, plus files (names or wildcards). A file's version is given by
+    its size and modification time or, if hashfiles, its contents. When
+    the cache exceeds maxsize bytes (default 1 GB), the least recently
+    used results are removed. Results must be picklable. f.clear()
+    removes the results of f.
+    '''
+    if function == None:
+        return lambda f: cached(f, files, hashfiles, maxsize)
+
+    import functools
+    path = _cachedir('cached')
+    if maxsize == None:
+        maxsize = _MEMOSIZE
+    import marshal
+    name = '%s.%s' % (function.__module__,
+                      getattr(function, '__qualname__', function.__name__))
+    code = marshal.dumps(function.__code__)
+    prefix = re.sub('[^a-zA-Z0-9_.]', '_', name)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        import pickle
+        import hashlib
+        fnames = _inputFiles(args) + _inputFiles(kwargs)
+        for pattern in files:
+            fnames += sorted(glob(pattern))
+        try:
+            key = pickle.dumps((name,
+                                code,
+                                args,
+                                sorted(kwargs.items()),
+                                [_fileKey(x, hashfiles) for x in fnames]),
+                               2)
+        except Exception:
+            # arguments that can't be pickled can't be keyed
+            return function(*args, **kwargs)
+        key = hashlib.sha1(key).hexdigest()
+        cachefile = os.path.join(path, '%s-%s.pkl' % (prefix, key))
+
+        if os.path.exists(cachefile):
+            try:
+                result = pickle.load(open(cachefile, 'rb'))
+                os.utime(cachefile, None)
+                return result
+            except Exception:
+                pass
 
-class Ntuple:
+        result = function(*args, **kwargs)
+        try:
+            record = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return result
+        tmpfile = '%s.%d.tmp' % (cachefile, os.getpid())
+        out = open(tmpfile, 'wb')
+        out.write(record)
+        out.close()
+        os.replace(tmpfile, cachefile)
+        _evict(path, maxsize)
+        return result
+
+    def clear():
+        for fname in glob(os.path.join(path, '%s-*.pkl' % prefix)):
+            os.remove(fname)
+    wrapper.clear = clear
+    return wrapper
+
+class Ntuple(_ArrayReader):
     '''
-    nt = Ntuple(filename, treename, firstrow=0, nrows=None, branches=None)
+    nt = Ntuple(filename, treename, firstrow=0, nrows=None, varnames=None,
+                cachesize=-1, learnentries=0, prefetch=0)
+
+    Only the branches of the selected variables (varnames, default all)
+    are read, through a TTreeCache of cachesize bytes (-1 = ROOT default)
+    that is told up front which branches to cache. If learnentries > 0,
+    the cache also learns, during the first learnentries entries, which
+    other branches are used. If prefetch > 0, baskets are decompressed
+    ahead of use by prefetch background threads. See cacheStats().
+
+    Note: learnentries and prefetch are process-wide switches of ROOT,
+    which stay on after the ntuple is gone and apply to every tree read
+    afterwards: learnentries sets TTreeCache::SetLearnEntries, and
+    prefetch turns on TTreeCacheUnzip parallel unzipping and, unless
+    already on, ROOT's implicit multi-threading with prefetch threads.
 '''
     # "self" is Python's equivalent of the "this" pointer in C++
     # self points to the memory allocated for the object
 
-    def __init__(self, filename, treename, firstrow=0, nrows=None, varnames=None):
+    def __init__(self, filename, treename, firstrow=0, nrows=None, varnames=None,
+                 cachesize=-1, learnentries=0, prefetch=0):
         # cache inputs
         self.status = 0
 
@@ -962,6 +2520,18 @@ class Ntuple:
         else:
             self.filename = filename
 
+        # expand wildcards
+        fnames = []
+        for fname in self.filename:
+            if os.path.exists(fname) or not re.search('[*?[]', fname):
+                fnames.append(fname)
+                continue
+            matched = sorted(glob(fname))
+            if len(matched) == 0:
+                sys.exit("** Ntuple *** no root files match %s" % fname)
+            fnames += matched
+        self.filename = fnames
+
         self.currentTreeNumber = -1
         self.treename = treename
         self.nrows = nrows
@@ -986,6 +2556,14 @@ class Ntuple:
             self.status = -3
             return
 
+        # the read cache created for each file must be able to
+        # decompress baskets ahead of use in background threads
+        if prefetch:
+            if prefetch is True: prefetch = 2
+            ROOT.TTreeCacheUnzip.SetParallelUnzip(ROOT.TTreeCacheUnzip.kEnable)
+            if not ROOT.IsImplicitMTEnabled():
+                ROOT.EnableImplicitMT(prefetch)
+
         # create a chain of files
         self.chain = ROOT.TChain(treename)
         if not self.chain:
@@ -1019,17 +2597,121 @@ class Ntuple:
             self.status = -1
             return
 
+        self.vars = []
+        self.counted = {}  # variable length arrays and their counters
+        self.vars = self.__findVariables(branches, varnames)
+                
+        nlen = len(self.vars)
+        if nlen == 0:
+            sys.exit("** Ntuple: no branches found!")
+
+        # ------------------------------------
+        # read only the branches we need and
+        # cache their baskets
+        # ------------------------------------
+        active = [name for tname, name, maxcount in self.vars]
+        for name in self.counted.values():
+            if name not in active: active.append(name)
+        if varnames != None:
+            tree.SetBranchStatus('*', 0)
+            for name in active:
+                tree.SetBranchStatus(name, 1)
+
+        if prefetch:
+            # use the threads for unzipping only, not for GetEntry
+            tree.SetImplicitMT(False)
+        if learnentries > 0:
+            ROOT.TTreeCache.SetLearnEntries(learnentries)
+        tree.SetCacheSize(cachesize)
+        if cachesize != 0:
+            for name in active:
+                tree.AddBranchToCache(name, True)
+            if learnentries <= 0:
+                tree.StopCacheLearningPhase()
+            
+        # create a map of variable name to column number
+        self.varmap = {}
+        for ind, var in enumerate(self.vars):
+            self.varmap[var] = ind
+
+        nentries = self.entries
+        if self.nrows != None:
+            self.entries = min(self.nrows, nentries) 
+        else:			
+            self.entries = nentries
+
+        self.buffermap  = {}
+        self.buffer = []
+        self.vectors = {}
+        self.accessors = {}
+        self.varname = []
+        self.friends = []
+        self.__makeBuffers(self.vars)
+
+        # create a generic event object
+        self.event = Buffer(self.buffer, self.buffermap, self.vars,
+                            self.vectors, self.accessors)
+
+        # Now that addresses are stable, give address of each variable
+        self.__setBranchAddresses(tree)
+
+        self.status = 0
+        # entries passing the current selection (see select)
+        self.selected = None
+        # entries of the files not yet processed and the record of the
+        # files processed (see incremental)
+        self.newentries = None
+        self.incrementer = None
+        # periodic record of the loop state (see checkpoint)
+        self.checkpointer = None
+        # progress report of the loop (see showProgress)
+        self.meter = None
+        # when the last event was returned, if profiling (see Profiler)
+        self.returned = None
+        # read statistics of the files of the chain already left, and the
+        # range of entries of the current file (see cacheStats)
+        self.cachetotals = {'readcalls': 0, 'bytesread': 0,
+                            'uncachedreadcalls': 0, 'uncachedbytesread': 0}
+        self.treerange = (0, 0)
+        # initialize row number
+        self.row = firstrow
+
+    # destructor
+    def __del__(self):
+        pass
+
+    def __setBranchAddresses(self, tree):
+        for name, jj in self.buffermap.items():
+            tree.SetBranchAddress(self.__branchName(name),
+                                  _addressof(self.buffer[jj], name))
+        for name, v in self.vectors.items():
+            tree.SetBranchAddress(self.__branchName(name), v)
+
+    def __branchName(self, name):
+        # qualify the names of friend variables, in case the ntuple has
+        # a branch of the same name that was not selected
+        for treename, fnames, alias, names in self.friends:
+            if name in names:
+                return '%s.%s' % (alias, name)
+        return name
+
+    def __findVariables(self, branches, varnames=None):
+        # return the (type, name, maxcount) of the branches to be read,
+        # skipping any whose names are already known
+        nbranches = branches.GetEntries()
+
         # varnames is given, create a regex to pick out
         # branches
         if varnames != None:
-            from string import joinfields
-            vname = r"\b(%s)" % joinfields(varnames, "|")
+            vname = r"\b(%s)" % str.join("|", varnames)
             findname = re.compile(vname)
         else:
             findname = None
             
-        bnamemap = {}        
-        self.vars = []
+        bnamemap = {}
+        for tname, bname, maxcount in self.vars:
+            bnamemap[bname] = 1
+        variables = []
         for i in range(nbranches):
             # get the ith branch (aka variable)
             bname = branches[i].GetName()
@@ -1060,35 +2742,20 @@ class Ntuple:
             # get leaf type (int, float, double, etc.)
             tname = leaf.GetTypeName()
 
-            if str.find(tname, 'vector') > -1:
-                #print('**skipping %s\t%s for now' % (tname, name))
-                continue
-            
             # check for leaf counter
             flag = c_int()
             leafcounter = leaf.GetLeafCounter(flag)
             if leafcounter:
                 maxcount = leafcounter.GetMaximum()
+                self.counted[bname] = leafcounter.GetBranch().GetName()
             else:
                 maxcount = leaf.GetLen()
 
             # store type and variable name
-            self.vars.append( (tname, bname, maxcount) )
-                
-        nlen = len(self.vars)
-        if nlen == 0:
-            sys.exit("** Ntuple: no branches found!")
-            
-        # create a map of variable name to column number
-        self.varmap = {}
-        for ind, var in enumerate(self.vars):
-            self.varmap[var] = ind
+            variables.append( (tname, bname, maxcount) )
+        return variables
 
-        nentries = self.entries
-        if self.nrows != None:
-            self.entries = min(self.nrows, nentries) 
-        else:			
-            self.entries = nentries
+    def __makeBuffers(self, variables):
         # ------------------------------------
         # set up branches as a struct
         # Root has a limit on how long a
@@ -1096,18 +2763,28 @@ class Ntuple:
         # into multiple strings
         # ------------------------------------
 
-        bufferCount = 0
+        bufferCount = len(self.buffer)
         newBuffer = True
         rec = ""
         bufferName = ""
         maxlength  = 2000
-        self.buffermap  = {}
-        self.buffer = []
 
-        self.varname= []
-        for count, (tname, name, maxcount) in enumerate(self.vars):
+        # std::vector branches are read into std::vector objects,
+        # everything else into structs
+        svars = []
+        for tname, name, maxcount in variables:
             self.varname.append((name, maxcount))
-            
+            depth, etype = _vectordepth(tname)
+            if depth == 0:
+                svars.append((tname, name, maxcount))
+            elif depth == 1:
+                self.vectors[name] = ROOT.std.vector(etype)()
+            else:
+                # nested vectors need a dictionary
+                ROOT.gInterpreter.GenerateDictionary(tname, "vector")
+                self.vectors[name] = ROOT.std.vector(ROOT.std.vector(etype))()
+
+        for count, (tname, name, maxcount) in enumerate(svars):
             # keep track of map from variable name to buffer count
             self.buffermap[name] = bufferCount
 
@@ -1116,17 +2793,13 @@ class Ntuple:
                 bufferName = "S%d_%d" % (self.postfix, bufferCount)
                 rec = "struct %s {" % bufferName
 
-            if str.find(tname, 'vector') > -1:
-                # special handling for vectors
-                continue
-            
-            elif maxcount == 1:
+            if maxcount == 1:
                 rec += "%s %s;" % (tname, name)
             else:				
                 rec += "%s %s[%d];" % (tname, name, maxcount)
 
             if (len(rec) > maxlength) or \
-                   (count >= len(self.vars)-1):
+                   (count >= len(svars)-1):
                 rec += "};"
                 newBuffer = True
 
@@ -1134,70 +2807,622 @@ class Ntuple:
 
                 ROOT.gROOT.ProcessLine(rec)
 
-                # now import struct
-                exec("from ROOT import %s" % bufferName)
-
                 # add to list of buffers
-                self.buffer.append(eval("%s()" % bufferName))
+                self.buffer.append(getattr(ROOT, bufferName)())
 
                 # remember to update buffer count
                 bufferCount += 1
 
-        # create a generic event object
-        self.event = Buffer(self.buffer, self.buffermap, self.vars)
-
-        # Now that addresses are stable, give address of each variable
-        for tname, name, maxcount in self.vars:
-            jj = self.buffermap[name]
-            tree.SetBranchAddress(name, ROOT.AddressOf(self.buffer[jj], name))
-
-        self.status = 0
-        # initialize row number
-        self.row = firstrow
-
-    # destructor
-    def __del__(self):
-        pass
+        # precompute how to get the value of each variable
+        for tname, name, maxcount in svars:
+            obj = self.buffer[self.buffermap[name]]
+            self.accessors[name] = _accessor(obj, name, tname, maxcount)
+        for tname, name, maxcount in variables:
+            if name in self.vectors:
+                self.accessors[name] = _vectorAccessor(self.vectors[name])
 
     def close(self):
         pass
     
     def size(self):
+        if self.selected is not None:
+            return len(self.selected)
         return int(self.entries)
 
     def numEntries(self):
-        return int(self.entries)
+        return self.size()
 
     def __len__(self):
-        return int(self.entries)
+        return self.size()
     
     def read(self, row):
+        if row < self.treerange[0] or row >= self.treerange[1]:
+            # about to leave the current file
+            self.__addCacheStats()
         localentry = self.chain.LoadTree(row)
         if self.chain.GetTreeNumber() != self.currentTreeNumber:
             self.currentTreeNumber = self.chain.GetTreeNumber()
             # Update branch addresses
             self.tree  = self.chain.GetTree()
-            for tname, name, maxcount in self.vars:
-                jj = self.buffermap[name]
-                self.tree.SetBranchAddress(name,
-                                           ROOT.AddressOf(self.buffer[jj], name))
+            self.__setBranchAddresses(self.tree)
+            self.__setTreeRange()
+
+        self.tree.GetEntry(localentry)
+
+    def __profiledRead(self, row, prof):
+        # read, timing each stage
+        if row < self.treerange[0] or row >= self.treerange[1]:
+            self.__addCacheStats()
+        start = prof.clock()
+        localentry = self.chain.LoadTree(row)
+        prof.record('LoadTree', start)
+        if self.chain.GetTreeNumber() != self.currentTreeNumber:
+            start = prof.clock()
+            self.currentTreeNumber = self.chain.GetTreeNumber()
+            self.tree  = self.chain.GetTree()
+            self.__setBranchAddresses(self.tree)
+            self.__setTreeRange()
+            prof.record('SetBranchAddress', start)
 
+        start = prof.clock()
         self.tree.GetEntry(localentry)
+        prof.record('GetEntry', start)
 
     def treeNumber(self):
         return (self.currentTreeNumber,
                 self.filename[self.currentTreeNumber])
 
+    def __currentCache(self):
+        f = self.chain.GetCurrentFile()
+        if not f: return None
+        cache = f.GetCacheRead(self.chain.GetTree())
+        if not cache: return None
+        return cache
+
+    def __addCacheStats(self):
+        # add the read statistics of the current file to the totals
+        cache = self.__currentCache()
+        if cache == None: return
+        self.cachetotals['readcalls'] += cache.GetReadCalls()
+        self.cachetotals['bytesread'] += cache.GetBytesRead()
+        self.cachetotals['uncachedreadcalls'] += cache.GetNoCacheReadCalls()
+        self.cachetotals['uncachedbytesread'] += cache.GetNoCacheBytesRead()
+
+    def __setTreeRange(self):
+        first = self.chain.GetChainOffset()
+        self.treerange = (first, first + self.tree.GetEntries())
+
+    def cacheStats(self):
+        '''
+        Return a dictionary of read statistics: cache size, number of read
+        calls and bytes read with and without the TTreeCache, and the hit
+        rate, i.e., the fraction of the bytes read that came via the cache.
+        The counts and hit rate are for all files read so far by loops
+        over the ntuple; the cache size and efficiency (the fraction of
+        the baskets prefetched that were used) are those of the current
+        file's cache.
+        '''
+        stats = {'cachesize': 0,
+                 'readcalls': 0, 'bytesread': 0,
+                 'uncachedreadcalls': 0, 'uncachedbytesread': 0,
+                 'hitrate': 0.0, 'efficiency': 0.0}
+        stats.update(self.cachetotals)
+        cache = self.__currentCache()
+        if cache != None:
+            stats['cachesize'] = cache.GetBufferSize()
+            stats['readcalls'] += cache.GetReadCalls()
+            stats['bytesread'] += cache.GetBytesRead()
+            stats['uncachedreadcalls'] += cache.GetNoCacheReadCalls()
+            stats['uncachedbytesread'] += cache.GetNoCacheBytesRead()
+            stats['efficiency'] = cache.GetEfficiency()
+        total = stats['bytesread'] + stats['uncachedbytesread']
+        if total > 0:
+            stats['hitrate'] = float(stats['bytesread']) / total
+        return stats
+
     def good(self):
         return self.status == 0
 
     def get(self, variable):
-        if self.buffermap.has_key(variable):
-            jj = self.buffermap[variable]
-            return self.buffer[jj].__getattribute__(variable)
+        if variable in self.accessors:
+            return self.accessors[variable](self.event)
         else:
             return None
 
+    def __batchChain(self):
+        # a separate chain, with all branches active, so that the branch
+        # addresses of the row-by-row interface are left untouched
+        if not hasattr(self, 'batchchain'):
+            self.batchchain = ROOT.TChain(self.treename)
+            for fname in self.filename:
+                self.batchchain.Add(fname)
+            self.batchfriends = []
+            for treename, fnames, alias, names in self.friends:
+                friend = ROOT.TChain(treename)
+                for fname in fnames:
+                    friend.Add(fname)
+                self.batchchain.AddFriend(friend, alias)
+                self.batchfriends.append(friend)
+        return self.batchchain
+
+    def addFriend(self, treename, filename, varnames=None):
+        '''
+        n = nt.addFriend(treename, filename, varnames=None)
+
+        Attach the tree treename in the file(s) filename as a friend of the
+        ntuple, e.g., columns computed by an earlier job. Its variables
+        (varnames, default all) are aligned with the ntuple by entry
+        number and can be used like the ntuple's own, in the event
+        buffer, in arrays() and in select(). Returns the number of
+        variables added. (writeSkim copies only the ntuple's own branches.)
+        '''
+        if type(filename) == type(""):
+            fnames = [filename]
+        else:
+            fnames = filename
+        for fname in fnames:
+            if not os.path.exists(fname):
+                sys.exit("** Ntuple.addFriend *** "\
+                         "root file %s not found" % fname)
+
+        friend = ROOT.TChain(treename)
+        for fname in fnames:
+            friend.Add(fname)
+        nentries = friend.GetEntries()
+        if nentries < self.chain.GetEntries():
+            print("** Ntuple.addFriend ** friend %s has %d entries, "\
+                  "but the ntuple has %d" % \
+                  (treename, nentries, self.chain.GetEntries()))
+
+        variables = self.__findVariables(friend.GetListOfBranches(), varnames)
+        if len(variables) == 0:
+            print("** Ntuple.addFriend ** no new variables in friend %s" % \
+                  treename)
+            return 0
+
+        alias = "histutil_friend%d" % len(self.friends)
+        self.chain.AddFriend(friend, alias)
+        self.friends.append((treename, fnames, alias,
+                             [name for tname, name, maxcount in variables]))
+        self.friendchains = getattr(self, 'friendchains', []) + [friend]
+
+        for var in variables:
+            self.varmap[var] = len(self.vars)
+            self.vars.append(var)
+            # in case the ntuple's own branches have been restricted
+            self.chain.SetBranchStatus(var[1], 1)
+            if var[1] in self.counted:
+                self.chain.SetBranchStatus(self.counted[var[1]], 1)
+        self.__makeBuffers(variables)
+        self.event._addAccessors()
+
+        # set the branch addresses again at the next read
+        self.tree = self.chain
+        self.currentTreeNumber = -1
+        self.__setBranchAddresses(self.chain)
+        if hasattr(self, 'batchchain'):
+            del self.batchchain
+        return len(variables)
+
+    def select(self, expr, cache=True):
+        '''
+        n = nt.select(expr, cache=True)
+
+        Restrict iteration and batch reads (arrays) to the entries for
+        which the cut expr (a TTreeFormula expression over branch names,
+        e.g., "njets > 2 && met > 100") is true and return their number;
+        select(None) removes the selection. The list of passing entries is
+        cached on disk (see HISTUTIL_CACHE), keyed by the files, their
+        sizes and modification times, and the expression, so that it is
+        computed only once. In incremental mode, only the entries of new
+        files are selected.
+        '''
+        import numpy as np
+        import hashlib
+        self.row = 0
+        if expr == None:
+            self.selected = self.newentries
+            return self.size()
+
+        key = [self.treename, int(self.entries), expr]
+        fnames = list(self.filename)
+        for treename, friendfiles, alias, names in self.friends:
+            key.append(treename)
+            fnames += friendfiles
+        for fname in fnames:
+            key.append((os.path.abspath(fname),
+                        os.path.getsize(fname),
+                        os.path.getmtime(fname)))
+        key = hashlib.sha1(repr(key).encode()).hexdigest()
+        cachefile = os.path.join(_cachedir('select'), '%s.npy' % key)
+
+        if cache and os.path.exists(cachefile):
+            self.selected = self.__newOnly(np.load(cachefile))
+            return self.size()
+
+        _declareReaders()
+        chain = self.__batchChain()
+        listname = "histutil_elist%d" % self.postfix
+        if chain.Draw(">>%s" % listname, expr, "entrylist",
+                      int(self.entries), 0) < 0:
+            sys.exit("** Ntuple.select ** can't evaluate %s" % expr)
+        elist = ROOT.gDirectory.Get(listname)
+        entries = ROOT.std.vector('Long64_t')()
+        ROOT.histutil_entryList(chain, elist, entries)
+        ROOT.gDirectory.Delete(listname)
+
+        self.selected = np.array(entries, dtype=np.int64)
+        if cache:
+            np.save(cachefile, self.selected)
+        self.selected = self.__newOnly(self.selected)
+        return self.size()
+
+    def __treeOffsets(self):
+        # the first entry of each file and the number of entries; the
+        # chain knows where a file starts only after it has been loaded
+        nfiles = len(self.filename)
+        self.__addCacheStats()
+        self.chain.LoadTree(self.chain.GetEntries()-1)
+        self.currentTreeNumber = -1
+        self.treerange = (0, 0)
+        offsets = [int(self.chain.GetTreeOffset()[i]) for i in range(nfiles)]
+        offsets.append(int(self.chain.GetEntries()))
+        return offsets
+
+    def __newOnly(self, entries):
+        import numpy as np
+        if self.newentries is None:
+            return entries
+        return np.intersect1d(entries, self.newentries, assume_unique=True)
+
+    def incremental(self, filename, hashfiles=False, **accumulators):
+        '''
+        newfiles = nt.incremental(filename, hashfiles=False, **accumulators)
+
+        Process only the files of the ntuple (e.g., given by a wildcard)
+        that were not processed in earlier runs, adding their contribution
+        to that of the earlier runs:
+
+            h = mkhist1(...)
+            counts = {'passed': 0}
+            nt = Ntuple('dataset/*.root', 'Events')
+            nt.incremental('dataset.pkl', h=h, counts=counts)
+            for event in nt:
+                ...
+            # the files processed and h and counts are saved in
+            # dataset.pkl at the end of the loop (or by nt.commit())
+
+        The accumulators (see Checkpoint) are restored from filename, if it
+        exists, and iteration and batch reads are restricted to the
+        entries of the new files, which are returned. A file is known by
+        its name and its size and modification time or, if hashfiles, its
+        contents; a file that has changed since it was processed is an
+        error, since its earlier contribution can't be removed.
+
+        If nrows stops the ntuple short of its last file, the files beyond
+        it are not recorded as processed, and a file cut partway is
+        recorded with the number of its entries processed, so that a later
+        run processes only the rest of it.
+        '''
+        import numpy as np
+        self.incrementer = Checkpoint(filename, 0, **accumulators)
+        state = self.incrementer.load(self.treename)
+        processed = {}
+        partial = {}
+        if state != None:
+            processed = state['files']
+            partial = state.get('partial', {})
+
+        # versions of the files processed completely, and version and
+        # number of entries processed of those processed in part
+        self.versions = {}
+        self.partial = {}
+        newfiles = []
+        ranges = []
+        offsets = self.__treeOffsets()
+        entries = int(self.entries)
+        for i, fname in enumerate(self.filename):
+            name = os.path.abspath(fname)
+            version = _fileKey(fname, hashfiles)
+            if name in processed or name in partial:
+                if name in processed:
+                    old, done = processed[name], None
+                else:
+                    old, done = partial[name]
+                if old != version:
+                    sys.exit("** Ntuple.incremental ** %s has changed since "\
+                             "it was processed;\n\tremove %s to start "\
+                             "again" % (fname, filename))
+                if done == None:
+                    self.versions[name] = version
+                    continue
+            else:
+                done = 0
+            # the entries of this file within the ntuple not yet processed
+            first = int(offsets[i]) + done
+            last  = min(int(offsets[i+1]), entries)
+            if last > first:
+                ranges.append(np.arange(first, last, dtype=np.int64))
+            if int(offsets[i+1]) <= entries:
+                self.versions[name] = version
+                newfiles.append(fname)
+            elif last > first:
+                self.partial[name] = (version, last - int(offsets[i]))
+                newfiles.append(fname)
+            elif done > 0:
+                self.partial[name] = partial[name]
+        # files processed earlier that are no longer in the ntuple stay
+        # in the record
+        for name, version in processed.items():
+            if name not in self.versions:
+                self.versions[name] = version
+        for name, record in partial.items():
+            if name not in self.versions and name not in self.partial:
+                self.partial[name] = record
+
+        self.newentries = np.zeros(0, dtype=np.int64)
+        if len(ranges) > 0:
+            self.newentries = np.concatenate(ranges)
+        if self.selected is None:
+            self.selected = self.newentries
+        else:
+            self.selected = self.__newOnly(self.selected)
+        self.row = 0
+        print("== Ntuple: %d of %d files are new" % \
+              (len(newfiles), len(self.filename)))
+        return newfiles
+
+    def commit(self):
+        '''
+        nt.commit()
+
+        Record, in incremental mode, that the entries of the ntuple have
+        been processed, together with the current state of the
+        accumulators. This is done at the end of each complete loop.
+        '''
+        if self.incrementer == None:
+            return
+        self.incrementer.save(self.treename, files=self.versions,
+                              partial=self.partial)
+
+    def writeSkim(self, outfile, branches=None, selection=None,
+                  compression=None, basketsize=None, nworkers=1,
+                  progress=False):
+        '''
+        n = nt.writeSkim(outfile, branches=None, selection=None,
+                         compression=None, basketsize=None, nworkers=1,
+                         progress=False)
+
+        Copy the selected entries and branches of all files of the
+        ntuple (its first nrows rows, if nrows was given) to a new tree in
+        outfile and return the number of entries written.
+
+          branches     branch names (wildcards allowed); default: the
+                       branches of the ntuple's variables
+          selection    a cut (see select); default: the current
+                       selection, if any, otherwise all entries
+          compression  a ROOT compression setting or "LZ4", "ZSTD",
+                       "LZMA", "ZLIB", optionally with a level, e.g.,
+                       "ZSTD:7"; default: that of the input
+          basketsize   basket size in bytes; default: that of the input
+          nworkers     number of processes; the files are skimmed in
+                       parallel and the results merged
+          progress     True, or a report interval in seconds, to report
+                       the progress in files (see Progress)
+
+        If neither the entries, compression nor basket size change, the
+        compressed baskets are copied as they are.
+        '''
+        import numpy as np
+        setting = _compressionSetting(compression)
+        if branches == None:
+            friendvars = {}
+            for treename, fnames, alias, names in self.friends:
+                for name in names: friendvars[name] = 1
+            branches = [name for tname, name, maxcount in self.vars
+                        if name not in friendvars]
+            branches += [name for name in self.counted.values()
+                         if name not in friendvars]
+
+        # find the selected entries in each file, and the number of its
+        # entries within the ntuple's rows (see nrows)
+        nfiles = len(self.filename)
+        offsets = self.__treeOffsets()
+        maxentries = [max(min(offsets[i+1], int(self.entries)) - offsets[i], 0)
+                      for i in range(nfiles)]
+        selections = [selection] * nfiles
+        if selection == None and self.selected is not None:
+            bounds = np.searchsorted(self.selected, offsets)
+            for i in range(nfiles):
+                selections[i] = self.selected[bounds[i]:bounds[i+1]] - \
+                    offsets[i]
+
+        if nfiles == 1:
+            parts = [outfile]
+        else:
+            base = os.path.splitext(outfile)[0]
+            parts = ['%s_part%d.root' % (base, i) for i in range(nfiles)]
+        jobs = [(self.filename[i], self.treename, parts[i], branches,
+                 selections[i], setting, basketsize, maxentries[i])
+                for i in range(nfiles)]
+
+        results = _runJobs(_skimFile, jobs, min(nworkers, nfiles), progress,
+                           'files')
+        nentries = sum([n for fname, n in results])
+
+        if nfiles > 1:
+            # the parts have the same compression, so their baskets
+            # are merged without being decompressed
+            if setting == None:
+                # that of the input, rather than ROOT's default
+                fin = ROOT.TFile.Open(self.filename[0])
+                setting = fin.GetCompressionSettings()
+                fin.Close()
+            merger = ROOT.TFileMerger(False, False)
+            merger.OutputFile(outfile, "RECREATE", setting)
+            for fname in parts:
+                merger.AddFile(fname, False)
+            if not merger.Merge():
+                sys.exit("** Ntuple.writeSkim ** can't merge files into %s" % \
+                         outfile)
+            for fname in parts:
+                os.remove(fname)
+        return nentries
+
+    def arrays(self, variables=None, first=0, nrows=None):
+        '''
+        data = nt.arrays(variables=None, first=0, nrows=None)
+
+        Read the given variables (default: all) for rows first to
+        first+nrows-1 (default: to the last row) into a dictionary of
+        numpy arrays keyed by variable name. Scalars give 1-D arrays,
+        fixed length arrays 2-D arrays and variable length arrays and
+        std::vectors Jagged arrays (Jagged arrays of Jagged arrays for
+        vectors of vectors). If a selection is active, the rows are
+        those of the selected entries.
+        '''
+        import numpy as np
+        last = self.size()
+        if nrows != None:
+            last = min(first + nrows, last)
+
+        entries = ROOT.nullptr
+        if self.selected is not None:
+            # a long long array is passed to C++ as a const Long64_t*
+            entries = np.ascontiguousarray(self.selected).view(np.longlong)
+        return self.__readArrays(variables, first, last, entries, 'arrays')
+
+    def readEntries(self, indices, variables=None):
+        '''
+        data = nt.readEntries(indices, variables=None)
+
+        Read the given variables (default: all) for the entries with the
+        given entry numbers (ignoring any selection), in any order and
+        possibly repeated, into a dictionary of numpy arrays as for
+        arrays(). The entries are read once each, in storage order, i.e.,
+        grouped by file and cluster, and the results are returned in the
+        order requested.
+        '''
+        import numpy as np
+        indices = np.asarray(indices, dtype=np.int64)
+        nentries = self.chain.GetEntries()
+        if len(indices) > 0 and \
+               (indices.min() < 0 or indices.max() >= nentries):
+            sys.exit("** Ntuple.readEntries ** entry numbers must be "\
+                     "in [0, %d]" % (nentries-1))
+        entries, order = np.unique(indices, return_inverse=True)
+        entries = np.ascontiguousarray(entries).view(np.longlong)
+        data = self.__readArrays(variables, 0, len(entries), entries,
+                                 'readEntries')
+        for name in data:
+            if isinstance(data[name], Jagged):
+                data[name] = data[name].take(order)
+            else:
+                data[name] = data[name][order]
+        return data
+
+    def buildIndex(self, major='run', minor='event'):
+        '''
+        nt.buildIndex(major='run', minor='event')
+
+        Build a TTreeIndex of the entries keyed by the values of the
+        expressions major and minor (e.g., run and event numbers) for use
+        by findEntries.
+        '''
+        chain = self.__batchChain()
+        if chain.BuildIndex(major, minor) < 0:
+            sys.exit("** Ntuple.buildIndex ** can't build index %s, %s" % \
+                     (major, minor))
+        self.index = (major, minor)
+
+    def findEntries(self, major, minor):
+        '''
+        entries = nt.findEntries(major, minor)
+
+        Return the entry numbers of the entries with the given index
+        values, e.g., lists of run and event numbers, as an array with -1
+        for values that are not found. The index is built by buildIndex,
+        by default from the run and event branches. See readEntries.
+        '''
+        import numpy as np
+        if not hasattr(self, 'index'):
+            self.buildIndex()
+        chain = self.__batchChain()
+        if not chain.GetTreeIndex():
+            # the batch chain has been recreated
+            self.buildIndex(*self.index)
+        _declareReaders()
+        major = np.ascontiguousarray(major, dtype=np.longlong)
+        minor = np.ascontiguousarray(minor, dtype=np.longlong)
+        if len(major) != len(minor):
+            sys.exit("** Ntuple.findEntries ** major and minor values "\
+                     "differ in length")
+        entries = np.empty(len(major), dtype=np.longlong)
+        if len(entries) > 0:
+            ROOT.histutil_findEntries(chain, major, minor, len(entries),
+                                      entries)
+        return entries.astype(np.int64)
+
+    def __readArrays(self, variables, first, last, entries, caller):
+        # read the given variables for rows first to last-1, where a row
+        # is an entry number or, if entries is not null, an index into it
+        import numpy as np
+        prof = _profiler
+        if prof != None:
+            start = prof.clock()
+        _declareReaders()
+        if variables == None:
+            variables = [name for tname, name, maxcount in self.vars]
+        chain = self.__batchChain()
+        if last <= first:
+            # an empty range of entries would mean all of them
+            first, last = 0, 0
+            entries = np.zeros(1, dtype=np.longlong)
+
+        vtype = {}
+        for tname, name, maxcount in self.vars:
+            vtype[name] = (tname, maxcount)
+
+        data = {}
+        for name in variables:
+            if name not in vtype:
+                sys.exit("** Ntuple.%s ** unknown variable %s" % \
+                         (caller, name))
+            tname, maxcount = vtype[name]
+            branch = self.__branchName(name)
+            depth, etype = _vectordepth(tname)
+            stype = etype
+            if stype in ('bool', 'Bool_t'):
+                stype = 'unsigned char'
+            content = ROOT.std.vector(stype)()
+            offsets = ROOT.std.vector('Long64_t')()
+            if depth == 0 and maxcount == 1 and name not in self.counted:
+                ROOT.histutil_readValues[etype, stype](chain, branch,
+                                                       first, last, entries,
+                                                       content)
+                data[name] = np.asarray(content)
+            elif depth < 2:
+                ROOT.histutil_readArrays[etype, stype](chain, branch,
+                                                       first, last, entries,
+                                                       offsets, content)
+                values = np.asarray(content)
+                if depth == 0 and name not in self.counted:
+                    data[name] = values.reshape((-1, maxcount))
+                else:
+                    data[name] = Jagged(np.asarray(offsets), values)
+            else:
+                offsets2 = ROOT.std.vector('Long64_t')()
+                ROOT.histutil_readNested[etype, stype](chain, branch,
+                                                       first, last, entries,
+                                                       offsets, offsets2,
+                                                       content)
+                data[name] = Jagged(np.asarray(offsets),
+                                    Jagged(np.asarray(offsets2),
+                                           np.asarray(content)))
+        if prof != None:
+            prof.record('arrays', start)
+        return data
+
     def __call__(self, variable):
         return self.get(variable)
     
@@ -1214,16 +3439,93 @@ class Ntuple:
         return self.varname
     
     # Implement Python iterator protocol
+    def checkpoint(self, filename, interval=300, **accumulators):
+        '''
+        resumed = nt.checkpoint(filename, interval=300, **accumulators)
+
+        While looping over the ntuple, record every interval seconds in
+        the file filename the current row and the state of the given
+        accumulators (see Checkpoint). If filename holds a checkpoint of
+        a loop over the same files and selection, the accumulators are
+        restored, the loop resumes after the last row recorded and True
+        is returned. The file is removed when the loop completes.
+        '''
+        self.checkpointer = Checkpoint(filename, interval, **accumulators)
+        self.nextcheck = 0
+        state = self.checkpointer.load(self.__checkpointKey())
+        if state == None:
+            return False
+        self.row = state['row']
+        # set the branch addresses again at the next read
+        self.currentTreeNumber = -1
+        print("== Ntuple: resuming at row %d (file %s)" % \
+              (self.row, self.filename[state['treenumber']]))
+        return True
+
+    def __checkpointKey(self):
+        key = [self.treename, int(self.entries), self.size()]
+        for fname in self.filename:
+            key.append(os.path.abspath(fname))
+        for treename, fnames, alias, names in self.friends:
+            key.append((treename, [os.path.abspath(x) for x in fnames]))
+        return key
+
+    def __checkpoint(self):
+        # check the time only every so often
+        self.nextcheck = self.row + 1000
+        self.checkpointer(self.__checkpointKey(),
+                          row=self.row,
+                          treenumber=max(self.currentTreeNumber, 0))
+
+    def showProgress(self, interval=10, out=sys.stdout):
+        '''
+        nt.showProgress(interval=10, out=sys.stdout)
+
+        Report the progress of loops over the ntuple every interval
+        seconds (see Progress); showProgress(None) stops the reports.
+        '''
+        if interval == None:
+            self.meter = None
+            return
+        self.meter = Progress(self.size(), interval, 'events', out=out)
+
     def __iter__(self):
+        self.returned = None
         return self
 
     def __next__(self):
-        if self.row > self.entries-1:
+        prof = _profiler
+        if prof != None and self.returned != None:
+            # time spent in the body of the loop
+            prof.record('user', self.returned)
+            self.returned = None
+        if self.checkpointer != None and self.row >= self.nextcheck:
+            # rows before self.row have been processed
+            self.__checkpoint()
+        if self.meter != None:
+            self.meter(self.row)
+        if self.row > self.size()-1:
             self.row = 0
+            if self.checkpointer != None:
+                self.checkpointer.remove()
+            self.commit()
+            if self.meter != None:
+                self.meter.done(self.size())
+                self.meter = Progress(self.size(), self.meter.interval,
+                                      'events', out=self.meter.out)
             raise StopIteration
         else:
-            self.read(self.row)
+            if self.selected is not None:
+                row = int(self.selected[self.row])
+            else:
+                row = self.row
+            if prof != None:
+                self.__profiledRead(row, prof)
+            else:
+                self.read(row)
             self.row += 1
+            if prof != None:
+                self.returned = prof.clock()
             return self.event
 #------------------------------------------------------------------------------
 class Node:
@@ -1274,6 +3576,72 @@ class Node:
         return self.response
 
 #-----------------------------------------------------------------------------
+# C++ evaluator of a forest of decision trees stored as arrays of nodes
+# (see BDT.compile), with the same logic as BDT.__call__
+_BDT_EVALUATOR = '''// Created by histutil.BDT.compile
+#include <cmath>
+#include <algorithm>
+#include "Rtypes.h"
+
+namespace %(name)s_forest
+{
+  const int nnodes = %(nnodes)d;
+  const int ntrees = %(ntrees)d;
+  const int selector[nnodes] = {
+  %(selector)s};
+  const double cut[nnodes] = {
+  %(cut)s};
+  const bool cutType[nnodes] = {
+  %(cutType)s};
+  // the left and right child of each node
+  const int child[2*nnodes] = {
+  %(child)s};
+  const int nodeType[nnodes] = {
+  %(nodeType)s};
+  const double weight[ntrees] = {
+  %(weight)s};
+  const int root[ntrees] = {
+  %(root)s};
+}
+
+void %(name)s(const double* rows, Long64_t nrows, Long64_t nvars,
+  int numTrees, bool normweights, double* values)
+{
+  using namespace %(name)s_forest;
+  int maxtrees = ntrees;
+  if ( numTrees > 0 && numTrees < ntrees ) maxtrees = numTrees;
+  double norm = 0;
+  for(int itree=0; itree < maxtrees; itree++) norm += weight[itree];
+
+  // the rows are scored a block at a time, tree by tree, so that the
+  // nodes of a tree and the rows of a block stay in the cache
+  const Long64_t blocksize = 256;
+  for(Long64_t first=0; first < nrows; first += blocksize)
+    {
+      Long64_t last = std::min(first + blocksize, nrows);
+      for(Long64_t i=first; i < last; i++) values[i] = 0;
+      for(int itree=0; itree < maxtrees; itree++)
+        for(Long64_t i=first; i < last; i++)
+          {
+            const double* x = rows + i*nvars;
+            int k = root[itree];
+            while ( nodeType[k] == 0 )
+              {
+                // go right if the cut selects signal
+                bool goesRight = (x[selector[k]] > cut[k]) == cutType[k];
+                k = child[2*k + goesRight];
+              }
+            values[i] += weight[itree] * nodeType[k];
+          }
+      for(Long64_t i=first; i < last; i++)
+        if ( normweights )
+          values[i] /= norm;
+        else
+          values[i] = 1.0/(1 + std::exp(-values[i]));
+    }
+}
+'''
+
 class BDT:
     def __init__(self, filename, normweights=False):        
         import re
@@ -1304,11 +3672,21 @@ class BDT:
                                  'self.forest.append')
             record = str.replace(record,';','')
             exec(record)
+
+        # name of the compiled evaluator (see compile)
+        self.evaluator = None
                 
     def __del__(self):
         pass
 
     def __call__(self, inputValues, numTrees=-1):
+        if self.evaluator != None:
+            import numpy as np
+            return float(self.scores(np.array([inputValues], dtype=float),
+                                     numTrees)[0])
+        prof = _profiler
+        if prof != None:
+            start = prof.clock()
 
         totalTrees = len(self.forest)
         if numTrees > 0:
@@ -1330,7 +3708,9 @@ class BDT:
         if self.normweights:
             value /= norm
         else:
-            value = 1.0/(1 + exp(-value))
+            value = 1.0/(1 + math.exp(-value))
+        if prof != None:
+            prof.record('BDT', start)
         return value
 
     def __len__(self):
@@ -1338,6 +3718,113 @@ class BDT:
     
     def variables(self):
         return self.varnames
+
+    def __flatten(self):
+        # the nodes of all trees as arrays, children given by node number
+        # (-1 for none), and the node number of the root of each tree
+        nodes = []
+        number = {}
+        roots = []
+        for root in self.forest:
+            roots.append(len(nodes))
+            stack = [root]
+            while len(stack) > 0:
+                node = stack.pop()
+                number[id(node)] = len(nodes)
+                nodes.append(node)
+                for child in (node.right, node.left):
+                    if child: stack.append(child)
+        def index(child):
+            if child: return number[id(child)]
+            return -1
+        columns = {'selector': [node.selector for node in nodes],
+                   'cut':      [node.cutValue for node in nodes],
+                   'cutType':  [int(bool(node.cutType)) for node in nodes],
+                   'left':     [index(node.left) for node in nodes],
+                   'right':    [index(node.right) for node in nodes],
+                   'nodeType': [node.nodeType for node in nodes]}
+        return (columns, roots)
+
+    def compile(self):
+        '''
+        bdt.compile()
+
+        Compile the forest to native code: the trees are written, as
+        arrays of nodes, to a C++ evaluator that is compiled once, with
+        optimization, by ACLiC and cached on disk (see HISTUTIL_CACHE),
+        keyed by the forest, so that later jobs only load the library. If
+        there is no compiler, the evaluator is given to the interpreter.
+        Afterwards, bdt(inputValues) and bdt.scores(data) use the compiled
+        evaluator.
+        '''
+        import hashlib
+        columns, roots = self.__flatten()
+        key = hashlib.sha1(repr((columns, roots, self.weights)).encode())
+        name = 'histutil_bdt_%s' % key.hexdigest()[:16]
+        if not hasattr(ROOT, name):
+            def values(x, fmt):
+                # 8 values per line
+                x = [fmt % v for v in x]
+                return ',\n  '.join([', '.join(x[i:i+8])
+                                      for i in range(0, len(x), 8)])
+            record = _BDT_EVALUATOR % {
+                'name':     name,
+                'nnodes':   len(columns['cut']),
+                'ntrees':   len(roots),
+                'selector': values(columns['selector'], '%d'),
+                'cut':      values(columns['cut'], '%r'),
+                'cutType':  values(columns['cutType'], '%d'),
+                'child':    values([c for pair in zip(columns['left'],
+                                                      columns['right'])
+                                        for c in pair], '%d'),
+                'nodeType': values(columns['nodeType'], '%d'),
+                'weight':   values(self.weights, '%r'),
+                'root':     values(roots, '%d')}
+            source = os.path.join(_cachedir('bdt'), '%s.C' % name)
+            if not os.path.exists(source):
+                tmpfile = '%s.%d.tmp' % (source, os.getpid())
+                open(tmpfile, 'w').write(record)
+                os.replace(tmpfile, source)
+            if not ROOT.gSystem.CompileMacro(source, 'kO'):
+                print("** BDT ** can't compile %s; using the interpreter" % \
+                      source)
+                if not ROOT.gInterpreter.Declare(record):
+                    sys.exit("** BDT ** can't compile the forest")
+        self.evaluator = name
+
+    def scores(self, data, numTrees=-1):
+        '''
+        y = bdt.scores(data, numTrees=-1)
+
+        Return, as a numpy array, the BDT value of each row of data, a
+        2-D array with a column per variable, in the order of variables(),
+        or a dictionary of 1-D arrays keyed by variable name (e.g., from
+        Ntuple.arrays or Table.arrays). The forest is compiled, if it has
+        not been already (see compile).
+        '''
+        import numpy as np
+        prof = _profiler
+        if prof != None:
+            start = prof.clock()
+        if self.evaluator == None:
+            self.compile()
+        if isinstance(data, dict):
+            for name in self.varnames:
+                if name not in data:
+                    sys.exit("** BDT.scores ** variable %s missing" % name)
+            data = np.column_stack([data[name] for name in self.varnames])
+        data = np.ascontiguousarray(data, dtype=np.float64)
+        if data.ndim != 2 or data.shape[1] != len(self.varnames):
+            sys.exit("** BDT.scores ** data must have %d columns" % \
+                     len(self.varnames))
+        values = np.zeros(len(data), dtype=np.float64)
+        if len(data) > 0:
+            getattr(ROOT, self.evaluator)(data, len(data), data.shape[1],
+                                          numTrees, self.normweights,
+                                          values)
+        if prof != None:
+            prof.record('BDT', start)
+        return values
     
     def printTree(self, itree, depth=0, which=0, node=None):
         if which == 0:
@@ -1411,7 +3898,7 @@ class BDT:
             return
         
         name = self.varnames[node.selector]
-        if not self.countname.has_key(name):
+        if name not in self.countname:
             self.countname[name] = 0
         self.countname[name] += 1.0
         depth += 1